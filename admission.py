@@ -0,0 +1,227 @@
+import asyncio
+import functools
+import heapq
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from graphql import parse, FieldNode, FragmentDefinitionNode, FragmentSpreadNode, GraphQLError
+from robyn import Headers, Response
+
+# Priority classes, lower values are admitted first
+HIGH = 0
+NORMAL = 1
+LOW = 2
+PRIORITIES = {"high": HIGH, "normal": NORMAL, "low": LOW}
+
+# Fraction of a pool's queue each priority class may fill before it is shed
+SHED_THRESHOLDS = {HIGH: 1.0, NORMAL: 1.0, LOW: 0.5}
+
+# Estimated cost of GraphQL fields, in units of a cheap field
+GRAPHQL_FIELD_COSTS = {
+    "query": 10,
+    "replaceDocument": 10,
+    "deleteDocument": 2,
+}
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of being queued"""
+
+    def __init__(self, status_code: int, message: str, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.retry_after = retry_after
+
+    def to_response(self) -> Response:
+        # A Response object, since Robyn sends plain dicts as 200 JSON bodies
+        return Response(
+            status_code=self.status_code,
+            headers=Headers({
+                "Content-Type": "text/plain; charset=utf-8",
+                "Retry-After": str(self.retry_after),
+            }),
+            description=self.message,
+        )
+
+
+class AdmissionPool:
+    """Concurrency limit with a bounded priority queue for one traffic class.
+
+    Each request holds ``cost`` units of capacity while it runs. Requests that
+    cannot start immediately wait in a queue ordered by priority; when the
+    queue is full or a request waits too long it is rejected with a
+    Retry-After hint instead of adding unbounded latency.
+    """
+
+    def __init__(self, name: str, capacity: int, max_queue: int, queue_timeout: float = 10.0):
+        self.name = name
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_use = 0
+        self._waiters: List[tuple] = []
+        self._sequence = itertools.count()
+        # Moving average of how long an admitted request holds its slot
+        self._service_time = 1.0
+        self.admitted = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls, name: str, capacity: int, max_queue: int) -> "AdmissionPool":
+        """Build a pool, allowing ADMISSION_<NAME>_CONCURRENCY/_QUEUE overrides"""
+        prefix = f"ADMISSION_{name.upper()}"
+        return cls(
+            name,
+            capacity=int(os.getenv(f"{prefix}_CONCURRENCY", capacity)),
+            max_queue=int(os.getenv(f"{prefix}_QUEUE", max_queue)),
+            queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10")),
+        )
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter[3].done())
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog is expected to drain"""
+        backlog = self.queued + 1
+        return max(1, math.ceil(self._service_time * backlog / self.capacity))
+
+    def _reject(self, status_code: int, reason: str) -> AdmissionRejected:
+        self.rejected += 1
+        return AdmissionRejected(status_code, f"{self.name} {reason}, retry later", self.retry_after())
+
+    async def acquire(self, priority: int = NORMAL, cost: int = 1) -> None:
+        if not self.queued and self.in_use + cost <= self.capacity:
+            self.in_use += cost
+            self.admitted += 1
+            return
+
+        queued = self.queued
+        if queued >= self.max_queue:
+            raise self._reject(503, "queue is full")
+        if queued >= self.max_queue * SHED_THRESHOLDS.get(priority, 1.0):
+            raise self._reject(429, "is overloaded")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), cost, future))
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            # On Python 3.12+ the slot can be granted in the same loop
+            # iteration as the timeout; hand it back before rejecting
+            if future.done() and not future.cancelled():
+                self.release(cost)
+            raise self._reject(503, "queue timed out")
+        except asyncio.CancelledError:
+            # The slot may have been granted just before the caller went away
+            if future.done() and not future.cancelled():
+                self.release(cost)
+            raise
+        self.admitted += 1
+
+    def release(self, cost: int = 1) -> None:
+        self.in_use -= cost
+        self._grant()
+
+    def _grant(self) -> None:
+        # Strict priority order; a large request at the head is not overtaken
+        while self._waiters:
+            _, _, cost, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.in_use + cost > self.capacity:
+                break
+            heapq.heappop(self._waiters)
+            self.in_use += cost
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, priority: int = NORMAL, cost: int = 1):
+        """Hold capacity for the duration of a request"""
+        cost = min(max(cost, 1), self.capacity)
+        await self.acquire(priority, cost)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - started)
+            self.release(cost)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "capacity": self.capacity,
+            "in_use": self.in_use,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+def request_priority(request) -> int:
+    """Priority class requested through the X-Priority header"""
+    value = request.headers.get("X-Priority")
+    return PRIORITIES.get((value or "").strip().lower(), NORMAL)
+
+
+def estimate_graphql_cost(query: Optional[str]) -> int:
+    """Estimate the cost of a GraphQL operation from the fields it selects"""
+    if not query:
+        return 1
+    try:
+        document = parse(query)
+    except GraphQLError:
+        # Invalid documents are rejected cheaply by the schema itself
+        return 1
+
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if isinstance(definition, FragmentDefinitionNode)
+    }
+
+    def selection_cost(selection_set, seen) -> int:
+        if selection_set is None:
+            return 0
+        cost = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                cost += GRAPHQL_FIELD_COSTS.get(selection.name.value, 1)
+                cost += selection_cost(selection.selection_set, seen)
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                if name in fragments and name not in seen:
+                    cost += selection_cost(fragments[name].selection_set, seen | {name})
+            else:
+                cost += selection_cost(selection.selection_set, seen)
+        return cost
+
+    total = sum(
+        selection_cost(definition.selection_set, frozenset())
+        for definition in document.definitions
+        if not isinstance(definition, FragmentDefinitionNode)
+    )
+    return max(total, 1)
+
+
+def admit(pool: AdmissionPool, cost: Optional[Callable[[Any], int]] = None):
+    """Decorator running a Robyn handler inside an admission pool slot"""
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request):
+            weight = cost(request) if cost is not None else 1
+            try:
+                async with pool.slot(request_priority(request), weight):
+                    return await handler(request)
+            except AdmissionRejected as e:
+                return e.to_response()
+
+        return wrapper
+
+    return decorator
@@ -2,6 +2,11 @@ import click
 import uvicorn
 from pathlib import Path
 import os
+import asyncio
+import json
+import math
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, TextIO, Tuple
 from dotenv import load_dotenv
 
 @click.group()
@@ -13,8 +18,33 @@ def cli():
 @click.option('--port', default=8000, help='Port to run the server on')
 @click.option('--host', default='127.0.0.1', help='Host to run the server on')
 @click.option('--dev', is_flag=True, default=False, help='Enable development mode with hot reloading')
-def serve(port: int, host: str, dev: bool):
+@click.option('--shard-id', type=int, default=None, help='Serve a single shard of a partitioned index')
+@click.option('--shard-count', type=int, default=None, help='Total number of shards (with --shard-id)')
+@click.option('--shards', default=None, help='Comma-separated shard URLs; run as a query coordinator')
+@click.option('--data-dir', default=None, help='Directory holding this server\'s documents')
+@click.option('--watch', is_flag=True, default=False, help='Reindex files added, changed or removed in the data directory')
+@click.option('--watch-interval', type=float, default=None, help='Seconds between data directory scans (with --watch)')
+@click.option('--watch-debounce', type=float, default=None, help='Seconds a burst of changes must be quiet before reindexing (with --watch)')
+def serve(port: int, host: str, dev: bool, shard_id: Optional[int], shard_count: Optional[int],
+          shards: Optional[str], data_dir: Optional[str], watch: bool,
+          watch_interval: Optional[float], watch_debounce: Optional[float]):
     """Start the Robyn server"""
+    # Sharding settings are read by main.py from the environment on import
+    if shard_id is not None:
+        os.environ['SHARD_ID'] = str(shard_id)
+    if shard_count is not None:
+        os.environ['SHARD_COUNT'] = str(shard_count)
+    if shards:
+        os.environ['SHARD_URLS'] = shards
+    if data_dir:
+        os.environ['DATA_DIR'] = data_dir
+    if watch:
+        os.environ['WATCH_DATA_DIR'] = '1'
+    if watch_interval is not None:
+        os.environ['WATCH_INTERVAL'] = str(watch_interval)
+    if watch_debounce is not None:
+        os.environ['WATCH_DEBOUNCE'] = str(watch_debounce)
+
     if dev:
         import subprocess
         import sys
@@ -58,6 +88,189 @@ def query(question: str):
     )
     click.echo(response.json())
 
+def _read_questions(stream, skip: Set[str]) -> Iterator[Tuple[str, str]]:
+    """Yield (id, question) pairs from JSONL, skipping already answered ids"""
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise click.BadParameter(f'line {line_number} is not valid JSON: {e}',
+                                     param_hint='INPUT_FILE')
+        if not isinstance(item, dict) or 'question' not in item:
+            raise click.BadParameter(f'line {line_number} has no "question" key',
+                                     param_hint='INPUT_FILE')
+        question_id = str(item.get('id', line_number))
+        if question_id not in skip:
+            yield question_id, item['question']
+
+def _retry_after(value: Optional[str]) -> float:
+    """Seconds to wait from a Retry-After header, 1 if absent or not a number"""
+    try:
+        delay = float(value)
+    except (TypeError, ValueError):
+        # HTTP-date values are not worth parsing for a short backoff
+        return 1.0
+    return delay if math.isfinite(delay) and delay >= 0 else 1.0
+
+def _backoff(attempt: int) -> float:
+    """Exponential delay before retrying a request the server never answered"""
+    return min(0.5 * 2 ** attempt, 30.0)
+
+def _unwrap(response) -> Tuple[int, Any]:
+    """Status code and body of a server response.
+
+    Handlers return {"status_code", "body", "type"} dicts, which the server
+    sends as a 200 JSON body; those are unwrapped to the status they carry.
+    """
+    try:
+        payload = response.json()
+    except ValueError:
+        return response.status_code, response.text
+    if isinstance(payload, dict) and isinstance(payload.get('status_code'), int) and 'body' in payload:
+        return payload['status_code'], payload['body']
+    return response.status_code, payload
+
+def _completed_ids(output_path: Path) -> Set[str]:
+    """Ids that already have a successful result in an output file"""
+    completed = set()
+    if output_path.exists():
+        with open(output_path) as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line may be truncated if the run was killed
+                    continue
+                if 'response' in result:
+                    completed.add(result['id'])
+    return completed
+
+def _percentile(values: List[float], percent: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+async def _run_batch(questions: Iterator[Tuple[str, str]], output: TextIO, url: str,
+                     concurrency: int, retries: int, timeout: float) -> Dict[str, Any]:
+    """Send questions over a pooled keep-alive client, streaming results to output"""
+    import httpx
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    latencies: List[float] = []
+    failures = 0
+
+    async def ask(client, question_id: str, question: str) -> Dict[str, Any]:
+        result = {'id': question_id, 'question': question}
+        started = time.monotonic()
+        for attempt in range(retries + 1):
+            try:
+                response = await client.post(f'{url}/query', json={'question': question})
+            except httpx.HTTPError as e:
+                result['error'] = str(e)
+                if attempt < retries:
+                    await asyncio.sleep(_backoff(attempt))
+                continue
+            status_code, body = _unwrap(response)
+            # Back off as the server asks when it is shedding load
+            if status_code in (429, 503) and attempt < retries:
+                await asyncio.sleep(_retry_after(response.headers.get('Retry-After')))
+                continue
+            result['status_code'] = status_code
+            if status_code == 200 and isinstance(body, dict) and 'response' in body:
+                result['response'] = body['response']
+                result.pop('error', None)
+            else:
+                result['error'] = body if isinstance(body, str) else json.dumps(body)
+            break
+        result['latency_ms'] = round((time.monotonic() - started) * 1000, 1)
+        return result
+
+    async def worker(client):
+        nonlocal failures
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            result = await ask(client, *item)
+            if 'response' in result:
+                latencies.append(result['latency_ms'])
+            else:
+                failures += 1
+            output.write(json.dumps(result) + '\n')
+            output.flush()
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    started = time.monotonic()
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        workers = [asyncio.create_task(worker(client)) for _ in range(concurrency)]
+        try:
+            for item in questions:
+                await queue.put(item)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            # Stop in-flight requests before the client closes if reading input failed
+            for task in workers:
+                task.cancel()
+    elapsed = time.monotonic() - started
+
+    completed = len(latencies) + failures
+    return {
+        'completed': completed,
+        'failed': failures,
+        'elapsed_s': round(elapsed, 2),
+        'throughput_qps': round(completed / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': _percentile(latencies, 50),
+        'p90_ms': _percentile(latencies, 90),
+        'p99_ms': _percentile(latencies, 99),
+    }
+
+@cli.command('batch')
+@click.argument('input_file', type=click.File('r'), default='-')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), default=None,
+              help='JSONL file to write results to (default: stdout)')
+@click.option('--concurrency', type=click.IntRange(min=1), default=8, help='Number of questions in flight at once')
+@click.option('--url', default='http://localhost:8000', help='Base URL of the server')
+@click.option('--resume', is_flag=True, default=False,
+              help='Skip questions already answered in the output file and append to it')
+@click.option('--retries', default=3, help='Retries for overloaded or unreachable server')
+@click.option('--timeout', default=120.0, help='Per-request timeout in seconds')
+def batch(input_file, output: Optional[str], concurrency: int, url: str, resume: bool,
+          retries: int, timeout: float):
+    """Query many questions from a JSONL file or stdin.
+
+    Each input line is a JSON object with a "question" and an optional "id".
+    Results are written as JSONL as they complete, followed by a throughput
+    and latency summary on stderr.
+    """
+    if resume and output is None:
+        raise click.UsageError('--resume requires --output')
+
+    skip = _completed_ids(Path(output)) if resume else set()
+    if skip:
+        click.echo(f"Resuming: skipping {len(skip)} answered questions", err=True)
+
+    questions = _read_questions(input_file, skip)
+    with click.open_file(output or '-', 'a' if resume else 'w') as out:
+        if resume and out.tell() > 0:
+            # Terminate a line left incomplete by an interrupted run
+            with open(output, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    out.write('\n')
+        summary = asyncio.run(
+            _run_batch(questions, out, url.rstrip('/'), concurrency, retries, timeout)
+        )
+
+    click.echo(json.dumps(summary), err=True)
+
 @cli.command()
 def setup():
     """Setup the project environment"""
@@ -0,0 +1,79 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+import sharding
+from document_store import store, DEFAULT_TOP_K
+
+
+class SingleFlight:
+    """Share one in-progress execution between identical concurrent calls.
+
+    The first caller for a key starts the work in its own task; callers
+    arriving with the same key while it is still running wait for and
+    receive the same result. A caller that is cancelled stops waiting
+    without cancelling the work the others share. Nothing is cached once
+    the execution finishes.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        # Number of executions actually run and of callers that joined one
+        self.executed = 0
+        self.coalesced = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    async def do(self, key: Hashable, work: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(work())
+            self._in_flight[key] = task
+            self.executed += 1
+            task.add_done_callback(lambda done: self._finished(key, done))
+        # Shield so no single caller going away cancels the shared work
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Mark the exception as retrieved in case every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": self.in_flight,
+        }
+
+
+# Shared by the REST /query endpoint and the GraphQL query field
+query_flight = SingleFlight()
+
+
+async def answer_question(question: str, top_k: int = DEFAULT_TOP_K) -> Optional[str]:
+    """Answer a question, coalescing identical in-flight requests.
+
+    Requests only share an execution when they target the same index
+    version. Returns None when no documents have been indexed yet.
+    """
+    if sharding.coordinator is not None:
+        return await query_flight.do(
+            ("coordinator", question, top_k),
+            lambda: sharding.coordinator.query(question, top_k),
+        )
+
+    if store.index is None:
+        return None
+
+    async def run_query() -> str:
+        query_engine = store.query_engine(top_k)
+        response = await query_engine.aquery(question)
+        return str(response)
+
+    return await query_flight.do((store.version, question, top_k), run_query)
@@ -0,0 +1,160 @@
+import hashlib
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from llama_index.core.schema import BaseNode
+
+# MinHash parameters: 64 permutations split into 16 LSH bands of 4 rows
+NUM_PERMUTATIONS = 64
+NUM_BANDS = 16
+SHINGLE_SIZE = 3
+# Estimated Jaccard similarity above which two chunks are treated as the same.
+# None matches exact duplicates only: chunks that differ in a single fact,
+# such as a price or a party name, are near-duplicates but not the same content.
+DEFAULT_THRESHOLD = None
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(1)
+_PERM_A = _rng.integers(1, _MERSENNE_PRIME, NUM_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.integers(0, _MERSENNE_PRIME, NUM_PERMUTATIONS, dtype=np.uint64)
+
+
+def normalize(text: str) -> List[str]:
+    """Lowercased words, used as MinHash shingles"""
+    return re.findall(r"\w+", text.lower())
+
+
+def content_hash(text: str) -> str:
+    """Hash of a chunk's exact text, ignoring only differences in whitespace.
+
+    Signs, decimal points and other punctuation can change what a chunk
+    says, so they are kept.
+    """
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def minhash(words: List[str]) -> np.ndarray:
+    """MinHash signature over word shingles"""
+    shingles = {
+        " ".join(words[i:i + SHINGLE_SIZE])
+        for i in range(max(len(words) - SHINGLE_SIZE + 1, 1))
+    }
+    hashes = np.array(
+        [
+            int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+            & _MERSENNE_PRIME
+            for s in shingles
+        ],
+        dtype=np.uint64,
+    )
+    # Products stay below 2**62, so uint64 arithmetic does not overflow
+    permuted = (np.outer(hashes, _PERM_A) + _PERM_B) % _MERSENNE_PRIME
+    return permuted.min(axis=0)
+
+
+class ChunkRegistry:
+    """Tracks unique chunks and the documents that reference them.
+
+    Chunks whose text is identical apart from whitespace, or whose estimated
+    Jaccard similarity reaches ``threshold``, are stored once; later copies only add
+    a reference from their document to the existing node. A node is released
+    once no live document references it.
+    """
+
+    def __init__(self, threshold: Optional[float] = DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        # Node id -> ids of the documents containing that chunk
+        self.references: Dict[str, Set[str]] = {}
+        # Document id -> node ids of its chunks
+        self.documents: Dict[str, List[str]] = {}
+        self._exact: Dict[str, str] = {}
+        self._hashes: Dict[str, str] = {}
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._buckets: Dict[Tuple[int, bytes], Set[str]] = defaultdict(set)
+        self.duplicates = 0
+
+    def _bands(self, signature: np.ndarray):
+        rows = NUM_PERMUTATIONS // NUM_BANDS
+        for band in range(NUM_BANDS):
+            yield band, signature[band * rows:(band + 1) * rows].tobytes()
+
+    def _near_duplicate(self, signature: np.ndarray) -> Optional[str]:
+        candidates = set()
+        for key in self._bands(signature):
+            candidates.update(self._buckets.get(key, ()))
+        best, best_similarity = None, self.threshold
+        for node_id in candidates:
+            similarity = float(np.mean(self._signatures[node_id] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = node_id, similarity
+        return best
+
+    def _register(self, node_id: str, digest: str, signature: Optional[np.ndarray]) -> None:
+        self.references[node_id] = set()
+        self._exact[digest] = node_id
+        self._hashes[node_id] = digest
+        if signature is not None:
+            self._signatures[node_id] = signature
+            for key in self._bands(signature):
+                self._buckets[key].add(node_id)
+
+    def add(self, document_id: str, nodes: List[BaseNode]) -> List[BaseNode]:
+        """Record a document's chunks and return only those not stored yet"""
+        new_nodes = []
+        node_ids = []
+        for node in nodes:
+            text = node.get_content()
+            digest = content_hash(text)
+            existing = self._exact.get(digest)
+            signature = None
+            if existing is None and self.threshold is not None:
+                signature = minhash(normalize(text))
+                existing = self._near_duplicate(signature)
+
+            if existing is None:
+                self._register(node.node_id, digest, signature)
+                existing = node.node_id
+                new_nodes.append(node)
+            else:
+                self.duplicates += 1
+
+            self.references[existing].add(document_id)
+            node_ids.append(existing)
+
+        self.documents[document_id] = node_ids
+        return new_nodes
+
+    def release(self, document_id: str) -> List[str]:
+        """Drop a document's references and return node ids nothing references anymore"""
+        released = []
+        for node_id in set(self.documents.pop(document_id, [])):
+            references = self.references.get(node_id)
+            if references is None:
+                continue
+            references.discard(document_id)
+            if not references:
+                released.append(node_id)
+                self._forget(node_id)
+        return released
+
+    def _forget(self, node_id: str) -> None:
+        del self.references[node_id]
+        digest = self._hashes.pop(node_id)
+        if self._exact.get(digest) == node_id:
+            del self._exact[digest]
+        signature = self._signatures.pop(node_id, None)
+        if signature is not None:
+            for key in self._bands(signature):
+                bucket = self._buckets[key]
+                bucket.discard(node_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "unique_chunks": len(self.references),
+            "references": sum(len(refs) for refs in self.references.values()),
+            "duplicates_skipped": self.duplicates,
+        }
@@ -0,0 +1,304 @@
+import asyncio
+import hashlib
+import os
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Settings
+from llama_index.core.bridge.pydantic import Field
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import BaseNode, NodeWithScore, QueryBundle
+
+from dedup import ChunkRegistry, DEFAULT_THRESHOLD
+
+# Number of nodes retrieved for a question
+DEFAULT_TOP_K = 2
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TombstoneFilter(BaseNodePostprocessor):
+    """Drop retrieved nodes that no live document references anymore.
+
+    Retrieval over-fetches while tombstones are pending, so the surviving
+    nodes are cut back to ``top_k``.
+    """
+
+    tombstones: Set[str] = Field(default_factory=set)
+    top_k: Optional[int] = None
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "TombstoneFilter"
+
+    def _postprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None,
+    ) -> List[NodeWithScore]:
+        live = [node for node in nodes if node.node.node_id not in self.tombstones]
+        return live if self.top_k is None else live[:self.top_k]
+
+
+class DocumentStore:
+    """The vector index together with the files it was built from.
+
+    Documents are inserted into the index one file at a time. Chunks that
+    duplicate an existing chunk are not embedded again; the document just
+    references the stored node. Deleting or replacing a file tombstones the
+    nodes nothing else references so they disappear from results
+    immediately, and a background compaction later removes them from the
+    vector store and docstore.
+    """
+
+    def __init__(self, data_dir: str = "data", dedup_threshold: Optional[float] = DEFAULT_THRESHOLD):
+        self.data_dir = data_dir
+        self.index: Optional[VectorStoreIndex] = None
+        # File name -> ids of the LlamaIndex documents loaded from it
+        self.documents: Dict[str, List[str]] = {}
+        # Unique chunks and the documents referencing them
+        self.chunks = ChunkRegistry(dedup_threshold)
+        # Node ids hidden from queries until compaction removes them
+        self.tombstones: Set[str] = set()
+        # Content hash of each indexed file, to tell real changes from touches
+        self.hashes: Dict[str, str] = {}
+        # Bumped whenever the set of live documents changes
+        self.version = 0
+        self._lock = threading.Lock()
+        self._compaction: Optional[asyncio.Task] = None
+
+    def path_for(self, name: str) -> str:
+        """Path of a document inside the data directory"""
+        if not name or os.path.basename(name) != name:
+            raise ValueError(f"Invalid document name: {name}")
+        return os.path.join(self.data_dir, name)
+
+    def _register(self, documents: list) -> None:
+        for document in documents:
+            name = document.metadata.get("file_name", document.id_)
+            self.documents.setdefault(name, []).append(document.id_)
+
+    @staticmethod
+    def _split(documents: list) -> List[Tuple[str, List[BaseNode]]]:
+        """Split each document into chunks"""
+        return [
+            (document.id_, Settings.node_parser.get_nodes_from_documents([document]))
+            for document in documents
+        ]
+
+    @staticmethod
+    def _dedupe(chunks: ChunkRegistry, split: List[Tuple[str, List[BaseNode]]]) -> List[BaseNode]:
+        """Record each document's chunks and return those not already stored"""
+        new_nodes = []
+        for document_id, nodes in split:
+            new_nodes.extend(chunks.add(document_id, nodes))
+        return new_nodes
+
+    def _prepare(self, documents: list) -> List[BaseNode]:
+        """Chunks of new documents that still need to be embedded"""
+        # Split outside the lock; only the registry update needs it
+        split = self._split(documents)
+        with self._lock:
+            return self._dedupe(self.chunks, split)
+
+    def _release(self, document_ids: List[str]) -> None:
+        for document_id in document_ids:
+            self.tombstones.update(self.chunks.release(document_id))
+
+    def load_directory(self) -> None:
+        """Build the index from every file in the data directory"""
+        documents = SimpleDirectoryReader(self.data_dir).load_data()
+        chunks = ChunkRegistry(self.chunks.threshold)
+        index = VectorStoreIndex(self._dedupe(chunks, self._split(documents)))
+        hashes = {
+            name: file_hash(self.path_for(name))
+            for name in {document.metadata["file_name"] for document in documents}
+        }
+        with self._lock:
+            self.index = index
+            self.chunks = chunks
+            self.documents = {}
+            self.tombstones = set()
+            self.hashes = hashes
+            self._register(documents)
+            self.version += 1
+
+    def _load_file(self, name: str) -> list:
+        documents = SimpleDirectoryReader(input_files=[self.path_for(name)]).load_data()
+        for document in documents:
+            # Key by the file name so replacements find the previous version
+            document.metadata["file_name"] = name
+        return documents
+
+    def _commit(self, name: str, documents: list, content_hash: str) -> bool:
+        with self._lock:
+            previous = self.documents.pop(name, [])
+            self._release(previous)
+            self._register(documents)
+            self.hashes[name] = content_hash
+            self.version += 1
+        return bool(previous)
+
+    def add(self, name: str, content: bytes) -> bool:
+        """Save a document and index it, replacing any previous version.
+
+        Returns True if an existing document was replaced.
+        """
+        save_path = self.path_for(name)
+        os.makedirs(self.data_dir, exist_ok=True)
+        with open(save_path, "wb") as f:
+            f.write(content)
+        return self.index_file(name)
+
+    async def aadd(self, name: str, content: bytes) -> bool:
+        """Like add, but indexes without blocking the event loop"""
+        save_path = self.path_for(name)
+
+        def write() -> None:
+            os.makedirs(self.data_dir, exist_ok=True)
+            with open(save_path, "wb") as f:
+                f.write(content)
+
+        await asyncio.to_thread(write)
+        return await self.aindex_file(name)
+
+    def index_file(self, name: str) -> bool:
+        """Index a file already in the data directory, replacing any previous version.
+
+        Returns True if an existing document was replaced.
+        """
+        # The first document indexes whatever is already on disk
+        if self.index is None:
+            self.load_directory()
+            return False
+
+        documents = self._load_file(name)
+        new_nodes = self._prepare(documents)
+        try:
+            self.index.insert_nodes(new_nodes)
+        except Exception:
+            self._rollback(documents)
+            raise
+        return self._commit(name, documents, file_hash(self.path_for(name)))
+
+    async def aindex_file(self, name: str) -> bool:
+        """Like index_file, but parses and chunks off the event loop and embeds asynchronously"""
+        if self.index is None:
+            # The index is only published once it is complete, so building it
+            # in a thread never exposes a half-built index to queries
+            await asyncio.to_thread(self.load_directory)
+            return False
+
+        documents = await asyncio.to_thread(self._load_file, name)
+        content_hash = await asyncio.to_thread(file_hash, self.path_for(name))
+        new_nodes = await asyncio.to_thread(self._prepare, documents)
+        try:
+            await self.index.ainsert_nodes(new_nodes)
+        except Exception:
+            self._rollback(documents)
+            raise
+        return self._commit(name, documents, content_hash)
+
+    def _rollback(self, documents: list) -> None:
+        # The new chunks never reached the index, so there is nothing to tombstone
+        with self._lock:
+            for document in documents:
+                self.chunks.release(document.id_)
+
+    def forget(self, name: str) -> bool:
+        """Hide a document's nodes from queries, leaving the data directory alone.
+
+        Returns False if the document was not indexed.
+        """
+        self.path_for(name)
+        with self._lock:
+            previous = self.documents.pop(name, None)
+            self.hashes.pop(name, None)
+            if previous:
+                self._release(previous)
+                self.version += 1
+        return previous is not None
+
+    def delete(self, name: str) -> bool:
+        """Remove a document from disk and hide its nodes from queries.
+
+        Returns False if the document does not exist.
+        """
+        path = self.path_for(name)
+        indexed = self.forget(name)
+        if not os.path.exists(path):
+            return indexed
+        os.remove(path)
+        return True
+
+    def sources(self, node_id: str) -> List[str]:
+        """Names of the documents that contain a chunk"""
+        with self._lock:
+            document_ids = self.chunks.references.get(node_id, set())
+            return sorted(
+                name for name, ids in self.documents.items()
+                if document_ids.intersection(ids)
+            )
+
+    def _filter(self, top_k: int) -> TombstoneFilter:
+        with self._lock:
+            return TombstoneFilter(tombstones=set(self.tombstones), top_k=top_k)
+
+    def _similarity_top_k(self, top_k: int) -> int:
+        # Over-fetch while tombstones are pending so filtering still leaves top_k nodes
+        return top_k + len(self.tombstones)
+
+    def query_engine(self, top_k: int = DEFAULT_TOP_K):
+        """Query engine over the live documents"""
+        return self.index.as_query_engine(
+            similarity_top_k=self._similarity_top_k(top_k),
+            node_postprocessors=[self._filter(top_k)],
+        )
+
+    def retrieve(self, question: str, top_k: int = DEFAULT_TOP_K) -> List[NodeWithScore]:
+        """Top-k nodes from the live documents, without LLM synthesis"""
+        retriever = self.index.as_retriever(similarity_top_k=self._similarity_top_k(top_k))
+        return self._filter(top_k).postprocess_nodes(retriever.retrieve(question))
+
+    def compact(self) -> int:
+        """Delete tombstoned nodes from the index. Returns the number removed."""
+        with self._lock:
+            pending = list(self.tombstones)
+        if self.index is not None and pending:
+            self.index.delete_nodes(pending, delete_from_docstore=True)
+        with self._lock:
+            self.tombstones.difference_update(pending)
+        return len(pending)
+
+    async def _compact_in_background(self) -> None:
+        # Yield between passes so nodes released meanwhile are picked up too
+        while self.tombstones:
+            self.compact()
+            await asyncio.sleep(0)
+
+    def schedule_compaction(self) -> None:
+        """Run compaction on the event loop without blocking the caller.
+
+        Compaction runs on the same loop as the request handlers so it never
+        modifies the in-memory vector store while a query is reading it.
+        """
+        if not self.tombstones:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.compact()
+            return
+        if self._compaction is None or self._compaction.done():
+            self._compaction = loop.create_task(self._compact_in_background())
+
+
+# Shared by the REST handlers and the GraphQL schema; configured by main.py
+store = DocumentStore()
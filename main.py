@@ -1,4 +1,5 @@
 import os
+import asyncio
 from typing import Dict, Any
 from dotenv import load_dotenv
 from robyn import Robyn, Request, Response
@@ -16,21 +17,65 @@ import json
 import strawberry
 # Remove the missing import for graphiql
 # import strawberry.utils.graphiql
-from schema import schema, index as schema_index
+from schema import schema
+import sharding
+from sharding import ShardConfig, nodes_to_json, relay_response
+from document_store import store, DEFAULT_TOP_K
+from dedup import DEFAULT_THRESHOLD
+from coalescing import answer_question, query_flight
+from admission import AdmissionPool, admit, estimate_graphql_cost
+from watcher import DirectoryWatcher
 
 # Load environment variables
 load_dotenv()
 
+# Configure shard/coordinator mode from the environment
+sharding.configure(ShardConfig.from_env())
+DATA_DIR = sharding.config.data_dir
+store.data_dir = DATA_DIR
+# Similarity at which chunks count as near-duplicates; unset for exact matches only
+dedup_threshold = os.getenv("DEDUP_THRESHOLD")
+store.chunks.threshold = float(dedup_threshold) if dedup_threshold else DEFAULT_THRESHOLD
+
 # Initialize Robyn app
 app = Robyn(__file__)
 
+# Admission control for expensive endpoints; /health and /stats are never queued
+query_pool = AdmissionPool.from_env("query", capacity=8, max_queue=64)
+ingest_pool = AdmissionPool.from_env("ingest", capacity=1, max_queue=8)
+# GraphQL capacity is measured in estimated query cost units
+graphql_pool = AdmissionPool.from_env("graphql", capacity=40, max_queue=64)
+
+def graphql_request_cost(request: Request) -> int:
+    """Estimated cost of the GraphQL operation in a request."""
+    try:
+        return estimate_graphql_cost((request.json() or {}).get("query"))
+    except Exception:
+        return 1
+
 # Initialize LlamaIndex components
 llm = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 Settings.llm = llm
 Settings.node_parser = SimpleNodeParser()
 
-# Global index for storing document embeddings
-index = None
+# Optionally pick up files written straight to the data directory
+if os.getenv("WATCH_DATA_DIR") and sharding.coordinator is None:
+    watcher = DirectoryWatcher(
+        store,
+        interval=float(os.getenv("WATCH_INTERVAL", "1")),
+        debounce=float(os.getenv("WATCH_DEBOUNCE", "2")),
+    )
+
+    @app.startup_handler
+    async def start_watcher() -> None:
+        """Run the data directory watcher on the server's event loop."""
+        asyncio.get_running_loop().create_task(watcher.run())
+
+@app.shutdown_handler
+async def close_shard_connections() -> None:
+    """Close the coordinator's pooled connections to the shards."""
+    if sharding.coordinator is not None:
+        await sharding.coordinator.aclose()
 
 @app.get("/health")
 async def health_check(request: Request) -> Response:
@@ -38,6 +83,7 @@ async def health_check(request: Request) -> Response:
     return {"status_code": 200, "body": "OK", "type": "text"}
 
 @app.post("/upload")
+@admit(ingest_pool)
 async def upload_document(request: Request) -> Response:
     """Upload a document for analysis."""
     try:
@@ -49,53 +95,155 @@ async def upload_document(request: Request) -> Response:
         
         file_content = uploaded_file[filename]
         print(file_content)
-        save_path = os.path.join("data", filename)
 
-        # Save the file
-        with open(save_path, "wb") as f:
-            f.write(file_content)
+        # In coordinator mode the document is stored and indexed by its shard
+        if sharding.coordinator is not None:
+            shard_response = await sharding.coordinator.upload(filename, file_content)
+            return relay_response(shard_response)
 
-        # Create or update the index
-        global index
-        documents = SimpleDirectoryReader("data").load_data()
-        index = VectorStoreIndex.from_documents(documents)
-        
-        # Update the schema's index reference
-        global schema_index
-        schema_index = index
+        # Index only this document; a previous version is tombstoned
+        replaced = await store.aadd(filename, file_content)
+        store.schedule_compaction()
+
+        action = "replaced" if replaced else "uploaded"
+        return {
+            "status_code": 200,
+            "body": {"message": f"Document {filename} {action} and indexed successfully"},
+            "type": "json"
+        }
+    except ValueError as e:
+        return {"status_code": 400, "body": str(e), "type": "text"}
+    except Exception as e:
+        traceback.print_exc()
+        return {"status_code": 500, "body": str(e), "type": "text"}
+
+@app.put("/documents/:name")
+@admit(ingest_pool)
+async def replace_document(request: Request) -> Response:
+    """Replace the contents of a document and reindex it."""
+    try:
+        name = request.path_params["name"]
+        uploaded_file = request.files
+        if not uploaded_file:
+            return {"status_code": 400, "body": "No file uploaded", "type": "text"}
+
+        file_content = list(uploaded_file.values())[0]
+
+        if sharding.coordinator is not None:
+            shard_response = await sharding.coordinator.upload(name, file_content)
+            return relay_response(shard_response)
+
+        await store.aadd(name, file_content)
+        store.schedule_compaction()
 
         return {
             "status_code": 200,
-            "body": {"message": f"Document {filename} uploaded and indexed successfully"},
+            "body": {"message": f"Document {name} replaced and indexed successfully"},
             "type": "json"
         }
+    except ValueError as e:
+        return {"status_code": 400, "body": str(e), "type": "text"}
+    except Exception as e:
+        traceback.print_exc()
+        return {"status_code": 500, "body": str(e), "type": "text"}
+
+@app.delete("/documents/:name")
+@admit(ingest_pool)
+async def delete_document(request: Request) -> Response:
+    """Delete a document and remove it from the index."""
+    try:
+        name = request.path_params["name"]
+
+        if sharding.coordinator is not None:
+            shard_response = await sharding.coordinator.delete(name)
+            return relay_response(shard_response)
+
+        if not store.delete(name):
+            return {"status_code": 404, "body": f"Document {name} not found", "type": "text"}
+        store.schedule_compaction()
+
+        return {
+            "status_code": 200,
+            "body": {"message": f"Document {name} deleted successfully"},
+            "type": "json"
+        }
+    except ValueError as e:
+        return {"status_code": 400, "body": str(e), "type": "text"}
     except Exception as e:
         traceback.print_exc()
         return {"status_code": 500, "body": str(e), "type": "text"}
 
 @app.post("/query")
+@admit(query_pool)
 async def query_documents(request: Request) -> Response:
     """Query the documents using LlamaIndex."""
     try:
-        if index is None:
+        # Parse the request body
+        body = request.json()
+        if not body or "question" not in body:
+            return {"status_code": 400, "body": "No question provided", "type": "text"}
+
+        # Identical concurrent questions share a single execution
+        response = await answer_question(
+            body["question"], int(body.get("top_k", DEFAULT_TOP_K))
+        )
+        if response is None:
             return {
                 "status_code": 400,
                 "body": "No documents have been uploaded yet. Please upload a document first.",
                 "type": "text"
             }
 
-        # Parse the request body
+        return {
+            "status_code": 200,
+            "body": {"response": response},
+            "type": "json"
+        }
+    except Exception as e:
+        return {"status_code": 500, "body": str(e), "type": "text"}
+
+@app.get("/stats")
+async def query_stats(request: Request) -> Response:
+    """Counters for query coalescing, admission control and deduplication."""
+    return {
+        "status_code": 200,
+        "body": {
+            "query_coalescing": query_flight.stats(),
+            "deduplication": store.chunks.stats(),
+            "admission": {
+                pool.name: pool.stats()
+                for pool in (query_pool, ingest_pool, graphql_pool)
+            },
+        },
+        "type": "json"
+    }
+
+@app.post("/retrieve")
+@admit(query_pool)
+async def retrieve_nodes(request: Request) -> Response:
+    """Return the top-k nodes for a question without LLM synthesis.
+
+    Used by a coordinator to gather candidates from each shard.
+    """
+    try:
         body = request.json()
         if not body or "question" not in body:
             return {"status_code": 400, "body": "No question provided", "type": "text"}
 
-        # Create query engine and get response
-        query_engine = index.as_query_engine()
-        response = query_engine.query(body["question"])
+        # An empty shard simply contributes no candidates
+        if store.index is None:
+            return {"status_code": 200, "body": {"nodes": []}, "type": "json"}
+
+        nodes = nodes_to_json(
+            store.retrieve(body["question"], int(body.get("top_k", DEFAULT_TOP_K)))
+        )
+        # A deduplicated chunk may come from several documents
+        for node in nodes:
+            node["sources"] = store.sources(node["id"])
 
         return {
             "status_code": 200,
-            "body": {"response": str(response)},
+            "body": {"nodes": nodes},
             "type": "json"
         }
     except Exception as e:
@@ -144,13 +292,15 @@ async def graphql_ide() -> Response:
     return {"status_code": 200, "body": html, "type": "html"}
 
 @app.post("/graphql")
+@admit(graphql_pool, cost=graphql_request_cost)
 async def graphql_endpoint(request: Request) -> Response:
     """GraphQL query endpoint."""
     try:
         body = request.json()
         query = body.get("query")
         variables = body.get("variables")
-        context_value = {"request": request}
+        # Mutations that change documents queue in the ingest pool
+        context_value = {"request": request, "ingest_pool": ingest_pool}
         root_value = body.get("root_value")
         operation_name = body.get("operation_name")
 
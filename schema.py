@@ -1,8 +1,14 @@
+from contextlib import asynccontextmanager
 from typing import List, Optional
 import strawberry
 import os
 from llama_index.core import VectorStoreIndex, SimpleDirectoryReader
 from pathlib import Path
+import httpx
+import sharding
+from admission import request_priority
+from document_store import store
+from coalescing import answer_question, query_flight
 
 # Define GraphQL types
 @strawberry.type
@@ -18,9 +24,17 @@ class QueryResponse:
 class HealthStatus:
     status: str
 
-# Global reference to the index
-# This will be populated by the main application
-index = None
+@strawberry.type
+class CoalescingStats:
+    executed: int
+    coalesced: int
+    in_flight: int
+
+@strawberry.type
+class DocumentChange:
+    name: str
+    success: bool
+    message: str
 
 # Define the Query type
 @strawberry.type
@@ -34,7 +48,7 @@ class Query:
     def documents(self) -> List[Document]:
         """List all uploaded documents"""
         documents = []
-        data_dir = Path("data")
+        data_dir = Path(store.data_dir)
         
         if data_dir.exists():
             for file_path in data_dir.iterdir():
@@ -49,15 +63,65 @@ class Query:
         return documents
     
     @strawberry.field
-    def query(self, question: str) -> Optional[QueryResponse]:
+    async def query(self, question: str) -> Optional[QueryResponse]:
         """Query the documents using LlamaIndex"""
-        if index is None:
+        # Identical concurrent questions share a single execution
+        response = await answer_question(question)
+        if response is None:
             return None
-        
-        query_engine = index.as_query_engine()
-        response = query_engine.query(question)
-        
-        return QueryResponse(response=str(response))
+
+        return QueryResponse(response=response)
+
+    @strawberry.field
+    def coalescing_stats(self) -> CoalescingStats:
+        """Counters for query request coalescing"""
+        return CoalescingStats(**query_flight.stats())
+
+@asynccontextmanager
+async def ingest_slot(info: strawberry.Info):
+    """Hold a slot in the server's ingest pool, passed in the GraphQL context"""
+    context = info.context if isinstance(info.context, dict) else {}
+    pool = context.get("ingest_pool")
+    if pool is None:
+        yield
+        return
+    async with pool.slot(request_priority(context["request"])):
+        yield
+
+def shard_change(name: str, shard_response: httpx.Response) -> DocumentChange:
+    """Report the outcome of a mutation forwarded to a shard"""
+    result = sharding.unwrap_response(shard_response)
+    body = result["body"]
+    message = body.get("message", str(body)) if isinstance(body, dict) else str(body)
+    return DocumentChange(name=name, success=result["status_code"] == 200, message=message)
+
+# Define the Mutation type
+@strawberry.type
+class Mutation:
+    @strawberry.mutation
+    async def delete_document(self, info: strawberry.Info, name: str) -> DocumentChange:
+        """Delete a document and remove it from the index"""
+        async with ingest_slot(info):
+            if sharding.coordinator is not None:
+                shard_response = await sharding.coordinator.delete(name)
+                return shard_change(name, shard_response)
+
+            if not store.delete(name):
+                return DocumentChange(name=name, success=False, message=f"Document {name} not found")
+            store.schedule_compaction()
+            return DocumentChange(name=name, success=True, message=f"Document {name} deleted successfully")
+
+    @strawberry.mutation
+    async def replace_document(self, info: strawberry.Info, name: str, content: str) -> DocumentChange:
+        """Replace a document with new text content and reindex it"""
+        async with ingest_slot(info):
+            if sharding.coordinator is not None:
+                shard_response = await sharding.coordinator.upload(name, content.encode("utf-8"))
+                return shard_change(name, shard_response)
+
+            await store.aadd(name, content.encode("utf-8"))
+            store.schedule_compaction()
+            return DocumentChange(name=name, success=True, message=f"Document {name} replaced and indexed successfully")
 
 # Create the schema
-schema = strawberry.Schema(query=Query) 
\ No newline at end of file
+schema = strawberry.Schema(query=Query, mutation=Mutation) 
\ No newline at end of file
@@ -0,0 +1,247 @@
+import asyncio
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote
+
+import httpx
+from llama_index.core import get_response_synthesizer
+from llama_index.core.schema import NodeWithScore, TextNode
+from robyn import Headers, Response
+
+from document_store import DEFAULT_TOP_K
+from dedup import content_hash
+
+
+def shard_for(document_name: str, shard_count: int) -> int:
+    """Return the shard that owns a document, based on a hash of its name"""
+    digest = hashlib.sha1(document_name.encode("utf-8")).hexdigest()
+    return int(digest, 16) % shard_count
+
+
+@dataclass
+class ShardConfig:
+    """Sharding settings for this process.
+
+    A process is either a standalone server (the default), one shard of a
+    partitioned index (``SHARD_ID``/``SHARD_COUNT``) or a coordinator that
+    fans queries out to the shards listed in ``SHARD_URLS``.
+    """
+
+    shard_id: Optional[int] = None
+    shard_count: int = 1
+    shard_urls: List[str] = field(default_factory=list)
+    data_dir: str = "data"
+
+    @property
+    def is_shard(self) -> bool:
+        return self.shard_id is not None
+
+    @property
+    def is_coordinator(self) -> bool:
+        return bool(self.shard_urls)
+
+    @classmethod
+    def from_env(cls) -> "ShardConfig":
+        shard_id = os.getenv("SHARD_ID")
+        shard_urls = [
+            url.strip().rstrip("/")
+            for url in os.getenv("SHARD_URLS", "").split(",")
+            if url.strip()
+        ]
+        config = cls(
+            shard_id=int(shard_id) if shard_id else None,
+            shard_count=int(os.getenv("SHARD_COUNT", "1")),
+            shard_urls=shard_urls,
+        )
+        if config.is_shard and config.is_coordinator:
+            raise ValueError("A process cannot be both a shard and a coordinator")
+        if config.is_shard and not 0 <= config.shard_id < config.shard_count:
+            raise ValueError(
+                f"SHARD_ID must be between 0 and {config.shard_count - 1}"
+            )
+        # Shards on the same host each keep their documents in their own directory
+        default_dir = f"data/shard-{config.shard_id}" if config.is_shard else "data"
+        config.data_dir = os.getenv("DATA_DIR", default_dir)
+        return config
+
+
+def nodes_to_json(nodes: List[NodeWithScore]) -> List[Dict[str, Any]]:
+    """Serialize retrieved nodes so a coordinator can merge them"""
+    return [
+        {
+            "id": node.node.node_id,
+            "text": node.node.get_content(),
+            "score": node.score,
+            "metadata": node.node.metadata,
+        }
+        for node in nodes
+    ]
+
+
+def nodes_from_json(payload: List[Dict[str, Any]]) -> List[NodeWithScore]:
+    """Rebuild nodes returned by a shard's /retrieve endpoint"""
+    return [
+        NodeWithScore(
+            node=TextNode(id_=item["id"], text=item["text"], metadata=item["metadata"]),
+            score=item["score"],
+        )
+        for item in payload
+    ]
+
+
+def merge_top_k(results: List[List[NodeWithScore]], top_k: int) -> List[NodeWithScore]:
+    """Merge per-shard results into a single top-k list ordered by score.
+
+    The same chunk stored on several shards is only kept once.
+    """
+    merged = [node for nodes in results for node in nodes]
+    merged.sort(key=lambda node: node.score or 0.0, reverse=True)
+    unique, seen = [], set()
+    for node in merged:
+        digest = content_hash(node.node.get_content())
+        if digest not in seen:
+            seen.add(digest)
+            unique.append(node)
+    return unique[:top_k]
+
+
+def unwrap_response(shard_response: httpx.Response) -> Dict[str, Any]:
+    """The status code, body and type a shard's handler returned.
+
+    Robyn sends the ``{"status_code", "body", "type"}`` dicts returned by
+    handlers as 200 JSON bodies, so a shard's 404 arrives inside an HTTP 200
+    and is unwrapped here. Responses with a real status code, such as
+    admission rejections, are taken as they are.
+    """
+    result = {
+        "status_code": shard_response.status_code,
+        "body": shard_response.text,
+        "type": "text"
+    }
+    if shard_response.headers.get("content-type", "").startswith("application/json"):
+        try:
+            body = shard_response.json()
+        except ValueError:
+            body = shard_response.text
+        else:
+            result["type"] = "json"
+        if isinstance(body, dict) and isinstance(body.get("status_code"), int) and "body" in body:
+            result = {
+                "status_code": body["status_code"],
+                "body": body["body"],
+                "type": body.get("type", "json")
+            }
+        else:
+            result["body"] = body
+    retry_after = shard_response.headers.get("Retry-After")
+    if retry_after is not None:
+        result["headers"] = {"Retry-After": retry_after}
+    return result
+
+
+def relay_response(shard_response: httpx.Response) -> Response:
+    """Pass a shard's response through the coordinator with its status code"""
+    result = unwrap_response(shard_response)
+    if result["type"] == "json":
+        body, content_type = json.dumps(result["body"]), "application/json"
+    else:
+        body, content_type = str(result["body"]), "text/plain; charset=utf-8"
+    return Response(
+        status_code=result["status_code"],
+        headers=Headers({"Content-Type": content_type, **result.get("headers", {})}),
+        description=body,
+    )
+
+
+class ShardCoordinator:
+    """Scatter-gather retrieval over a set of shard servers.
+
+    Requests to the shards share one keep-alive connection pool, so queries
+    do not open new connections to every shard.
+    """
+
+    def __init__(self, shard_urls: List[str], timeout: float = 30.0):
+        self.shard_urls = shard_urls
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created on first use so it belongs to the server's event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    async def aclose(self) -> None:
+        """Close the pooled connections to the shards"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def url_for(self, document_name: str) -> str:
+        """Base URL of the shard that owns a document"""
+        return self.shard_urls[shard_for(document_name, len(self.shard_urls))]
+
+    async def _retrieve_from(
+        self, client: httpx.AsyncClient, url: str, question: str, top_k: int
+    ) -> List[NodeWithScore]:
+        response = await client.post(
+            f"{url}/retrieve", json={"question": question, "top_k": top_k}
+        )
+        result = unwrap_response(response)
+        if result["status_code"] != 200:
+            raise RuntimeError(f"Shard answered {result['status_code']}: {result['body']}")
+        return nodes_from_json(result["body"]["nodes"])
+
+    async def retrieve(self, question: str, top_k: int = DEFAULT_TOP_K) -> List[NodeWithScore]:
+        """Fan retrieval out to every shard concurrently and merge the results"""
+        results = await asyncio.gather(
+            *(self._retrieve_from(self.client, url, question, top_k) for url in self.shard_urls),
+            return_exceptions=True,
+        )
+
+        # A failing shard degrades the answer instead of failing the whole query
+        succeeded = []
+        for url, result in zip(self.shard_urls, results):
+            if isinstance(result, Exception):
+                print(f"Shard {url} failed: {result!r}")
+                continue
+            succeeded.append(result)
+        if not succeeded:
+            raise RuntimeError("All shards failed to answer the query")
+
+        return merge_top_k(succeeded, top_k)
+
+    async def query(self, question: str, top_k: int = DEFAULT_TOP_K) -> str:
+        """Retrieve from all shards, then run a single LLM synthesis"""
+        nodes = await self.retrieve(question, top_k)
+        synthesizer = get_response_synthesizer()
+        response = await synthesizer.asynthesize(question, nodes=nodes)
+        return str(response)
+
+    async def upload(self, filename: str, content: bytes) -> httpx.Response:
+        """Forward an uploaded document to the shard that owns it"""
+        return await self.client.post(
+            f"{self.url_for(filename)}/upload", files={"file": (filename, content)}
+        )
+
+    async def delete(self, filename: str) -> httpx.Response:
+        """Forward a document deletion to the shard that owns it"""
+        return await self.client.delete(
+            f"{self.url_for(filename)}/documents/{quote(filename, safe='')}"
+        )
+
+
+# Populated by the main application on startup
+config = ShardConfig()
+coordinator: Optional[ShardCoordinator] = None
+
+
+def configure(shard_config: ShardConfig) -> None:
+    """Install the sharding configuration for this process"""
+    global config, coordinator
+    config = shard_config
+    coordinator = ShardCoordinator(shard_config.shard_urls) if shard_config.is_coordinator else None
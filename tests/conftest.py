@@ -0,0 +1,14 @@
+import pytest
+from llama_index.core import MockEmbedding, Settings
+
+from document_store import DocumentStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    """A document store backed by a temporary data directory and fake embeddings"""
+    # Reading Settings.embed_model would resolve the default OpenAI embedding
+    original = Settings._embed_model
+    Settings.embed_model = MockEmbedding(embed_dim=8)
+    yield DocumentStore(data_dir=str(tmp_path))
+    Settings._embed_model = original
@@ -0,0 +1,156 @@
+import asyncio
+import pytest
+import unittest.mock as mock
+
+from robyn import Response
+
+from admission import (
+    AdmissionPool, AdmissionRejected, admit, estimate_graphql_cost, request_priority,
+    HIGH, NORMAL, LOW,
+)
+
+
+class MockRequest:
+    def __init__(self, headers=None):
+        self.headers = headers or {}
+
+
+async def hold(pool, started, release, priority=NORMAL, cost=1):
+    async with pool.slot(priority, cost):
+        started.append(priority)
+        await release.wait()
+
+
+@pytest.mark.asyncio
+async def test_requests_within_capacity_are_admitted():
+    pool = AdmissionPool("query", capacity=2, max_queue=2)
+    async with pool.slot():
+        async with pool.slot():
+            assert pool.in_use == 2
+    assert pool.in_use == 0
+    assert pool.admitted == 2
+
+
+@pytest.mark.asyncio
+async def test_full_queue_is_rejected_with_retry_after():
+    pool = AdmissionPool("query", capacity=1, max_queue=1)
+    release = asyncio.Event()
+    started = []
+    running = asyncio.ensure_future(hold(pool, started, release))
+    queued = asyncio.ensure_future(hold(pool, started, release))
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        await pool.acquire()
+    assert rejected.value.status_code == 503
+    assert rejected.value.to_response().headers.get("Retry-After") == "2"
+
+    release.set()
+    await asyncio.gather(running, queued)
+    assert pool.rejected == 1
+    assert pool.in_use == 0
+
+
+@pytest.mark.asyncio
+async def test_low_priority_is_shed_first():
+    pool = AdmissionPool("query", capacity=1, max_queue=2)
+    release = asyncio.Event()
+    started = []
+    tasks = [asyncio.ensure_future(hold(pool, started, release)) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        await pool.acquire(LOW)
+    assert rejected.value.status_code == 429
+
+    release.set()
+    await asyncio.gather(*tasks)
+
+
+@pytest.mark.asyncio
+async def test_queue_is_served_by_priority():
+    pool = AdmissionPool("query", capacity=1, max_queue=4)
+    release = asyncio.Event()
+    started = []
+    first = asyncio.ensure_future(hold(pool, started, release, NORMAL))
+    await asyncio.sleep(0)
+    low = asyncio.ensure_future(hold(pool, started, release, LOW))
+    high = asyncio.ensure_future(hold(pool, started, release, HIGH))
+    await asyncio.sleep(0)
+
+    release.set()
+    await asyncio.gather(first, low, high)
+    assert started == [NORMAL, HIGH, LOW]
+
+
+@pytest.mark.asyncio
+async def test_queue_timeout_is_rejected():
+    pool = AdmissionPool("ingest", capacity=1, max_queue=1, queue_timeout=0.01)
+    release = asyncio.Event()
+    running = asyncio.ensure_future(hold(pool, [], release))
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        await pool.acquire()
+    assert rejected.value.status_code == 503
+
+    release.set()
+    await running
+    assert pool.in_use == 0
+    assert pool.queued == 0
+
+
+@pytest.mark.asyncio
+async def test_slot_granted_at_timeout_is_released():
+    """A slot granted in the same iteration as the timeout is not leaked"""
+    pool = AdmissionPool("query", capacity=1, max_queue=1)
+    await pool.acquire()
+
+    async def grant_then_time_out(future, timeout):
+        # The running request finishes and hands its slot to the waiter...
+        pool.release()
+        assert future.done()
+        # ...but wait_for still reports the timeout, as on Python 3.12+
+        raise asyncio.TimeoutError
+
+    with mock.patch("admission.asyncio.wait_for", grant_then_time_out):
+        with pytest.raises(AdmissionRejected):
+            await pool.acquire()
+
+    assert pool.in_use == 0
+    assert pool.queued == 0
+
+
+@pytest.mark.asyncio
+async def test_admit_decorator_returns_rejection_response():
+    pool = AdmissionPool("graphql", capacity=1, max_queue=0)
+
+    @admit(pool)
+    async def handler(request):
+        return {"status_code": 200, "body": "OK", "type": "text"}
+
+    assert (await handler(MockRequest()))["status_code"] == 200
+    async with pool.slot():
+        response = await handler(MockRequest())
+    # Robyn only sends the status code and headers of a Response object
+    assert isinstance(response, Response)
+    assert response.status_code == 503
+    assert response.headers.get("Retry-After") == "1"
+    assert response.description == "graphql queue is full, retry later"
+
+
+def test_request_priority():
+    assert request_priority(MockRequest({"X-Priority": "high"})) == HIGH
+    assert request_priority(MockRequest({"X-Priority": "LOW"})) == LOW
+    assert request_priority(MockRequest({"X-Priority": "urgent"})) == NORMAL
+    assert request_priority(MockRequest()) == NORMAL
+
+
+def test_graphql_cost_estimate():
+    assert estimate_graphql_cost("{ health { status } }") == 2
+    assert estimate_graphql_cost('{ query(question: "Q") { response } }') == 11
+    assert estimate_graphql_cost(
+        'query { ...Expensive } fragment Expensive on Query { query(question: "Q") { response } }'
+    ) == 11
+    assert estimate_graphql_cost("{ not valid") == 1
+    assert estimate_graphql_cost(None) == 1
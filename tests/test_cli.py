@@ -1,4 +1,6 @@
 import pytest
+import os
+import json
 from unittest import mock
 from pathlib import Path
 from click.testing import CliRunner
@@ -129,4 +131,182 @@ def test_setup_command_env_exists(runner):
                 assert result.exit_code == 0
                 mock_mkdir.assert_called_once_with(exist_ok=True)
                 mock_write_text.assert_not_called()
-                assert "Setup complete!" in result.output 
\ No newline at end of file
+                assert "Setup complete!" in result.output 
+
+def test_serve_shard_mode(runner, monkeypatch):
+    """Test that shard options are passed to the server through the environment"""
+    mock_app = mock.MagicMock()
+    for var in ['SHARD_ID', 'SHARD_COUNT', 'SHARD_URLS', 'DATA_DIR']:
+        monkeypatch.delenv(var, raising=False)
+
+    with mock.patch.dict('sys.modules', {'main': mock.MagicMock(app=mock_app)}):
+        with mock.patch.dict('os.environ'):
+            result = runner.invoke(cli.cli, ['serve', '--port', '8001', '--shard-id', '0', '--shard-count', '2'])
+            assert result.exit_code == 0
+            assert os.environ['SHARD_ID'] == '0'
+            assert os.environ['SHARD_COUNT'] == '2'
+    mock_app.start.assert_called_once_with(port=8001, host='127.0.0.1')
+
+
+@pytest.fixture
+def mock_async_client():
+    """Route the batch command's pooled client to an in-process handler"""
+    import httpx
+    requests = []
+
+    def handler(request):
+        question = json.loads(request.content)['question']
+        requests.append(question)
+        if question == 'fail':
+            return httpx.Response(400, text='No documents')
+        return httpx.Response(200, json={'response': f'answer to {question}'})
+
+    real_client = httpx.AsyncClient
+
+    def client_factory(**kwargs):
+        return real_client(transport=httpx.MockTransport(handler), **kwargs)
+
+    with mock.patch('httpx.AsyncClient', side_effect=client_factory):
+        yield requests
+
+
+def test_batch_command(runner, mock_async_client, tmp_path):
+    """Test that batch queries stream JSONL results and a summary"""
+    questions = tmp_path / 'questions.jsonl'
+    questions.write_text('{"id": "a", "question": "one"}\n{"question": "two"}\n{"id": "c", "question": "fail"}\n')
+    output = tmp_path / 'results.jsonl'
+
+    result = runner.invoke(cli.cli, ['batch', str(questions), '-o', str(output), '--concurrency', '2'])
+    assert result.exit_code == 0
+
+    results = {r['id']: r for r in map(json.loads, output.read_text().splitlines())}
+    assert results['a']['response'] == 'answer to one'
+    assert results['2']['response'] == 'answer to two'
+    assert results['c']['status_code'] == 400
+    assert 'error' in results['c']
+    assert sorted(mock_async_client) == ['fail', 'one', 'two']
+
+    summary = json.loads(result.output.strip().splitlines()[-1])
+    assert summary['completed'] == 3
+    assert summary['failed'] == 1
+    assert 'p99_ms' in summary
+
+
+def test_batch_command_resume(runner, mock_async_client, tmp_path):
+    """Test that resuming skips questions that already have answers"""
+    questions = tmp_path / 'questions.jsonl'
+    questions.write_text('{"id": "a", "question": "one"}\n{"id": "b", "question": "two"}\n')
+    output = tmp_path / 'results.jsonl'
+    # An interrupted run answered "a" and left a partial line behind
+    output.write_text('{"id": "a", "question": "one", "response": "answer to one"}\n{"id": "b", "que')
+
+    result = runner.invoke(cli.cli, ['batch', str(questions), '-o', str(output), '--resume'])
+    assert result.exit_code == 0
+    assert mock_async_client == ['two']
+    assert output.read_text().splitlines()[-1].startswith('{"id": "b"')
+
+
+def test_batch_command_stdin(runner, mock_async_client):
+    """Test that batch reads questions from stdin and writes results to stdout"""
+    result = runner.invoke(cli.cli, ['batch'], input='{"question": "one"}\n')
+    assert result.exit_code == 0
+    assert '"response": "answer to one"' in result.output
+
+
+def test_batch_resume_requires_output(runner):
+    result = runner.invoke(cli.cli, ['batch', '--resume'], input='')
+    assert result.exit_code != 0
+    assert "--resume requires --output" in result.output
+
+
+def test_serve_watch_mode(runner, monkeypatch):
+    """Test that watch options are passed to the server through the environment"""
+    mock_app = mock.MagicMock()
+    for var in ['WATCH_DATA_DIR', 'WATCH_INTERVAL', 'WATCH_DEBOUNCE']:
+        monkeypatch.delenv(var, raising=False)
+
+    with mock.patch.dict('sys.modules', {'main': mock.MagicMock(app=mock_app)}):
+        with mock.patch.dict('os.environ'):
+            result = runner.invoke(cli.cli, ['serve', '--watch', '--watch-debounce', '5'])
+            assert result.exit_code == 0
+            assert os.environ['WATCH_DATA_DIR'] == '1'
+            assert os.environ['WATCH_DEBOUNCE'] == '5.0'
+            assert 'WATCH_INTERVAL' not in os.environ
+
+
+def test_batch_rejects_zero_concurrency(runner):
+    result = runner.invoke(cli.cli, ['batch', '--concurrency', '0'], input='')
+    assert result.exit_code == 2
+    assert '--concurrency' in result.output
+
+
+@pytest.mark.parametrize('line, message', [
+    ('{"question": "one"', 'line 2 is not valid JSON'),
+    ('{"id": "b"}', 'line 2 has no "question" key'),
+    ('["one"]', 'line 2 has no "question" key'),
+])
+def test_batch_rejects_malformed_lines(runner, mock_async_client, line, message):
+    """Test that a bad input line is reported with its line number"""
+    result = runner.invoke(cli.cli, ['batch'], input='{"question": "one"}\n' + line + '\n')
+    assert result.exit_code == 2
+    assert message in result.output
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('3', 3.0),
+    ('0.5', 0.5),
+    (None, 1.0),
+    ('Wed, 21 Oct 2026 07:28:00 GMT', 1.0),
+    ('-5', 1.0),
+    ('nan', 1.0),
+])
+def test_retry_after(value, expected):
+    assert cli._retry_after(value) == expected
+
+
+def test_batch_retries_with_backoff(runner):
+    """Connection errors back off exponentially, shed requests follow Retry-After"""
+    import httpx
+    responses = [
+        httpx.ConnectError('connection refused'),
+        httpx.ConnectError('connection refused'),
+        httpx.Response(503, text='query queue is full, retry later', headers={'Retry-After': '2'}),
+        # Handler dicts arrive as a 200 JSON body carrying the real status
+        httpx.Response(200, json={'status_code': 200, 'body': {'response': 'answer'}, 'type': 'json'}),
+    ]
+
+    def handler(request):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    real_client = httpx.AsyncClient
+    delays = []
+
+    async def record_sleep(delay):
+        delays.append(delay)
+
+    with mock.patch('httpx.AsyncClient', side_effect=lambda **kwargs: real_client(
+            transport=httpx.MockTransport(handler), **kwargs)), \
+            mock.patch('cli.asyncio.sleep', side_effect=record_sleep):
+        result = runner.invoke(cli.cli, ['batch', '--retries', '3'], input='{"question": "one"}\n')
+
+    assert result.exit_code == 0
+    assert delays == [0.5, 1.0, 2.0]
+    assert '"response": "answer"' in result.output
+
+
+def test_batch_records_unwrapped_errors(runner):
+    import httpx
+    envelope = {'status_code': 400, 'body': 'No documents have been uploaded yet.', 'type': 'text'}
+    real_client = httpx.AsyncClient
+
+    with mock.patch('httpx.AsyncClient', side_effect=lambda **kwargs: real_client(
+            transport=httpx.MockTransport(lambda request: httpx.Response(200, json=envelope)),
+            **kwargs)):
+        result = runner.invoke(cli.cli, ['batch'], input='{"id": "a", "question": "one"}\n')
+
+    record = json.loads(result.output.splitlines()[0])
+    assert record['status_code'] == 400
+    assert record['error'] == 'No documents have been uploaded yet.'
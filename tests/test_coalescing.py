@@ -0,0 +1,116 @@
+import asyncio
+import pytest
+import unittest.mock as mock
+
+import coalescing
+from coalescing import SingleFlight, answer_question
+from document_store import store
+
+
+@pytest.mark.asyncio
+async def test_identical_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+
+    assert results == ["answer"] * 5
+    assert calls == 1
+    assert flight.stats() == {"executed": 1, "coalesced": 4, "in_flight": 0}
+
+
+@pytest.mark.asyncio
+async def test_different_keys_run_separately():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    await asyncio.gather(flight.do("a", work), flight.do("b", work))
+    assert flight.executed == 2
+    assert flight.coalesced == 0
+
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_and_not_cached():
+    flight = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    results = await asyncio.gather(
+        flight.do("key", failing), flight.do("key", failing), return_exceptions=True
+    )
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+    async def working():
+        return "ok"
+
+    # A finished flight is forgotten, so the next call runs again
+    assert await flight.do("key", working) == "ok"
+    assert flight.executed == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_cancel_followers():
+    flight = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    leader = asyncio.ensure_future(flight.do("key", work))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(flight.do("key", work))
+    await asyncio.sleep(0)
+
+    # The client that started the execution disconnects
+    leader.cancel()
+    assert await follower == "answer"
+    assert leader.cancelled()
+    assert calls == 1
+    assert flight.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_answer_question_keys_on_index_version():
+    mock_index = mock.MagicMock()
+    query_engine = mock_index.as_query_engine.return_value
+
+    async def slow_query(question):
+        await asyncio.sleep(0.01)
+        return f"answer to {question}"
+
+    query_engine.aquery = mock.AsyncMock(side_effect=slow_query)
+
+    with mock.patch.object(store, "index", mock_index), \
+            mock.patch.object(coalescing, "query_flight", SingleFlight()):
+        first = asyncio.ensure_future(answer_question("What?"))
+        second = asyncio.ensure_future(answer_question("What?"))
+        await asyncio.sleep(0)
+        # A change to the index must not be answered by an older execution
+        with mock.patch.object(store, "version", store.version + 1):
+            third = await answer_question("What?")
+        results = await asyncio.gather(first, second)
+
+        assert results == ["answer to What?"] * 2
+        assert third == "answer to What?"
+        assert query_engine.aquery.call_count == 2
+        assert coalescing.query_flight.coalesced == 1
+
+
+@pytest.mark.asyncio
+async def test_answer_question_without_index():
+    with mock.patch.object(store, "index", None):
+        assert await answer_question("What?") is None
@@ -0,0 +1,67 @@
+from llama_index.core.schema import TextNode
+
+from dedup import ChunkRegistry, minhash, normalize
+
+TEXT = (
+    "This appendix describes the terms and conditions that apply to all services "
+    "provided under this agreement, including payment schedules, liability limits "
+    "and the procedure for resolving disputes between the parties."
+)
+
+
+def node(node_id, text):
+    return TextNode(id_=node_id, text=text)
+
+
+def similarity(a, b):
+    return float((minhash(normalize(a)) == minhash(normalize(b))).mean())
+
+
+def test_minhash_estimates_similarity():
+    assert similarity(TEXT, TEXT) == 1.0
+    assert similarity(TEXT, TEXT.replace("payment", "billing")) > 0.7
+    assert similarity(TEXT, "A completely different chunk about llamas and wings.") < 0.2
+
+
+def test_exact_duplicates_are_stored_once():
+    registry = ChunkRegistry()
+    assert len(registry.add("doc-a", [node("a1", TEXT)])) == 1
+    # Whitespace differences still count as the same chunk
+    assert registry.add("doc-b", [node("b1", "  " + TEXT.replace(" ", "\n"))]) == []
+    assert registry.references == {"a1": {"doc-a", "doc-b"}}
+    assert registry.documents["doc-b"] == ["a1"]
+    assert registry.duplicates == 1
+
+
+def test_near_duplicates_are_stored_once():
+    registry = ChunkRegistry(threshold=0.5)
+    registry.add("doc-a", [node("a1", TEXT)])
+    assert registry.add("doc-b", [node("b1", TEXT + " Version 2.")]) == []
+    assert registry.references["a1"] == {"doc-a", "doc-b"}
+
+
+def test_exact_match_keeps_signs_and_punctuation():
+    registry = ChunkRegistry()
+    registry.add("doc-a", [node("a1", "Net change: -5%")])
+    assert len(registry.add("doc-b", [node("b1", "Net change: 5%")])) == 1
+    assert len(registry.add("doc-c", [node("c1", "Net change: 5.0%")])) == 1
+    assert registry.duplicates == 0
+
+
+def test_near_duplicate_detection_is_off_by_default():
+    registry = ChunkRegistry()
+    registry.add("doc-a", [node("a1", TEXT)])
+    assert len(registry.add("doc-b", [node("b1", TEXT + " Version 2.")])) == 1
+
+
+def test_release_returns_unreferenced_nodes():
+    registry = ChunkRegistry()
+    registry.add("doc-a", [node("a1", TEXT), node("a2", "Only in document A.")])
+    registry.add("doc-b", [node("b1", TEXT)])
+
+    assert registry.release("doc-a") == ["a2"]
+    assert registry.release("doc-b") == ["a1"]
+    assert registry.stats() == {"unique_chunks": 0, "references": 0, "duplicates_skipped": 1}
+
+    # A released chunk is stored again the next time it appears
+    assert len(registry.add("doc-c", [node("c1", TEXT)])) == 1
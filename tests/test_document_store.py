@@ -0,0 +1,222 @@
+import threading
+
+import pytest
+from llama_index.core import Settings
+
+from document_store import DocumentStore, TombstoneFilter
+from llama_index.core.node_parser import NodeParser
+from llama_index.core.node_parser.node_utils import build_nodes_from_splits
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+
+def embedding_count(store):
+    return len(store.index.vector_store.data.embedding_dict)
+
+
+def test_first_upload_indexes_directory(store, tmp_path):
+    (tmp_path / "existing.txt").write_text("Already on disk")
+    store.add("new.txt", b"Uploaded document")
+    assert set(store.documents) == {"existing.txt", "new.txt"}
+    assert embedding_count(store) == 2
+
+
+def test_replace_tombstones_previous_version(store):
+    store.add("doc.txt", b"First version")
+    old_node_ids = set(store.chunks.references)
+
+    assert store.add("doc.txt", b"Second version") is True
+    assert store.tombstones == old_node_ids
+
+    nodes = store.retrieve("version", top_k=5)
+    assert [node.node.get_content() for node in nodes] == ["Second version"]
+
+
+def test_delete_hides_document_immediately(store, tmp_path):
+    store.add("keep.txt", b"Keep me")
+    store.add("drop.txt", b"Drop me")
+
+    assert store.delete("drop.txt") is True
+    assert not (tmp_path / "drop.txt").exists()
+    contents = [node.node.get_content() for node in store.retrieve("me", top_k=5)]
+    assert contents == ["Keep me"]
+    assert store.delete("drop.txt") is False
+
+
+def test_compaction_reclaims_storage(store):
+    store.add("a.txt", b"Alpha")
+    store.add("b.txt", b"Beta")
+    for version in range(3):
+        store.add("b.txt", f"Beta {version}".encode())
+    store.delete("a.txt")
+    assert embedding_count(store) == 5
+
+    assert store.compact() == 4
+    assert store.tombstones == set()
+    assert embedding_count(store) == 1
+
+
+@pytest.mark.asyncio
+async def test_schedule_compaction_runs_in_background(store):
+    store.add("a.txt", b"Alpha")
+    store.add("a.txt", b"Alpha again")
+
+    store.schedule_compaction()
+    assert store.tombstones
+    await store._compaction
+
+    assert store.tombstones == set()
+    assert embedding_count(store) == 1
+
+
+@pytest.mark.asyncio
+async def test_async_add_replaces_document(store, tmp_path):
+    assert await store.aadd("doc.txt", b"First version") is False
+    assert await store.aadd("doc.txt", b"Second version") is True
+
+    assert (tmp_path / "doc.txt").read_bytes() == b"Second version"
+    nodes = store.retrieve("version", top_k=5)
+    assert [node.node.get_content() for node in nodes] == ["Second version"]
+
+
+@pytest.mark.asyncio
+async def test_async_index_chunks_off_the_event_loop(store, monkeypatch):
+    await store.aadd("a.txt", b"Alpha")
+    threads = []
+    split = DocumentStore._split
+
+    def recording_split(documents):
+        threads.append(threading.current_thread())
+        return split(documents)
+
+    monkeypatch.setattr(DocumentStore, "_split", staticmethod(recording_split))
+    await store.aadd("b.txt", b"Beta")
+    assert threads and threading.main_thread() not in threads
+
+
+def test_invalid_document_name(store):
+    with pytest.raises(ValueError):
+        store.delete("../escape.txt")
+
+
+def test_tombstone_filter():
+    node = TextNode(id_="stale-node", text="stale")
+    live = NodeWithScore(node=TextNode(text="live"), score=1.0)
+    nodes = TombstoneFilter(tombstones={"stale-node"}).postprocess_nodes(
+        [NodeWithScore(node=node, score=1.0), live]
+    )
+    assert nodes == [live]
+
+
+def test_tombstone_filter_truncates_to_top_k():
+    nodes = [NodeWithScore(node=TextNode(id_=f"node-{i}", text=str(i)), score=1.0) for i in range(4)]
+    kept = TombstoneFilter(tombstones={"node-0"}, top_k=2).postprocess_nodes(nodes)
+    assert [node.node.node_id for node in kept] == ["node-1", "node-2"]
+
+
+def test_query_engine_synthesizes_from_top_k_nodes(store):
+    store.add("a.txt", b"Alpha")
+    store.add("b.txt", b"Beta")
+    store.add("c.txt", b"Gamma")
+    store.add("c.txt", b"Gamma again")
+    assert store.tombstones
+
+    engine = store.query_engine(top_k=2)
+    nodes = engine.retrieve(QueryBundle("letters"))
+    assert len(nodes) == 2
+
+
+FOOTER = "Confidential. This document is provided for internal use only and may not be redistributed."
+
+
+class ParagraphParser(NodeParser):
+    """Split every paragraph into its own chunk"""
+
+    def _parse_nodes(self, nodes, show_progress=False, **kwargs):
+        chunks = []
+        for node in nodes:
+            paragraphs = [p for p in node.get_content().split("\n\n") if p.strip()]
+            chunks.extend(build_nodes_from_splits(paragraphs, node, id_func=self.id_func))
+        return chunks
+
+
+@pytest.fixture
+def small_chunks():
+    original = Settings.node_parser
+    Settings.node_parser = ParagraphParser()
+    yield
+    Settings.node_parser = original
+
+
+def test_shared_chunks_are_stored_once(store, small_chunks):
+    store.add("a.txt", f"Quarterly revenue grew in every region.\n\n{FOOTER}".encode())
+    store.add("b.txt", f"The new office opens in March.\n\n{FOOTER}".encode())
+    # Rewrapped lines are still the same footer
+    wrapped = FOOTER.replace(". ", ".\n")
+    store.add("c.txt", f"Hiring is paused until next year.\n\n{wrapped}".encode())
+
+    assert embedding_count(store) == 4
+    footer_node = next(
+        node_id for node_id, refs in store.chunks.references.items() if len(refs) == 3
+    )
+    assert store.sources(footer_node) == ["a.txt", "b.txt", "c.txt"]
+
+    contents = [node.node.get_content() for node in store.retrieve("anything", top_k=10)]
+    assert contents.count(FOOTER) == 1
+
+
+TERMS = (
+    "The supplier shall deliver five hundred units of the product to the customer's "
+    "warehouse on the first business day of every calendar month for the duration of this "
+    "agreement. The customer shall pay {} per unit delivered, payable within thirty days of "
+    "receipt of a valid invoice. Late payments accrue interest at one percent per month. "
+    "Either party may terminate this agreement with ninety days written notice to the other "
+    "party, and all outstanding invoices become due on the date of termination. Deliveries "
+    "that arrive damaged may be returned at the supplier's expense within fourteen days."
+)
+
+
+def test_chunks_differing_in_a_key_fact_are_both_stored(store, small_chunks):
+    # Near-identical clauses whose prices differ must not be merged by default
+    store.add("acme.txt", f"Contract with ACME.\n\n{TERMS.format('$12.00')}".encode())
+    store.add("globex.txt", f"Contract with Globex.\n\n{TERMS.format('$15.00')}".encode())
+
+    assert store.chunks.duplicates == 0
+    contents = [node.node.get_content() for node in store.retrieve("price", top_k=10)]
+    assert TERMS.format("$12.00") in contents
+    assert TERMS.format("$15.00") in contents
+
+
+def test_chunks_differing_in_sign_are_both_stored(store):
+    store.add("a.txt", b"Net change: -5%")
+    store.add("b.txt", b"Net change: 5%")
+
+    assert store.chunks.duplicates == 0
+    contents = [node.node.get_content() for node in store.retrieve("change", top_k=5)]
+    assert sorted(contents) == ["Net change: -5%", "Net change: 5%"]
+
+
+def test_shared_chunk_survives_until_last_reference(store, small_chunks):
+    store.add("a.txt", f"Alpha body text.\n\n{FOOTER}".encode())
+    store.add("b.txt", f"Beta body text.\n\n{FOOTER}".encode())
+
+    store.delete("a.txt")
+    store.compact()
+    contents = [node.node.get_content() for node in store.retrieve("anything", top_k=10)]
+    assert sorted(contents) == sorted(["Beta body text.", FOOTER])
+
+    store.delete("b.txt")
+    store.compact()
+    assert embedding_count(store) == 0
+    assert store.chunks.stats()["unique_chunks"] == 0
+
+
+def test_replacing_unchanged_chunks_reuses_embeddings(store, small_chunks):
+    store.add("a.txt", f"Old introduction.\n\n{FOOTER}".encode())
+    footer_node = store.chunks.documents[store.documents["a.txt"][0]][-1]
+
+    store.add("a.txt", f"New introduction.\n\n{FOOTER}".encode())
+
+    assert footer_node in store.chunks.references
+    assert footer_node not in store.tombstones
+    assert store.compact() == 1
+    assert embedding_count(store) == 2
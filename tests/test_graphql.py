@@ -13,6 +13,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 # Import modules we need to test
 from main import graphql_ide, graphql_endpoint
 import schema
+from document_store import store
 
 # Helper function to convert Robyn response format to a dictionary
 def response_to_dict(response):
@@ -59,9 +60,10 @@ def response_to_dict(response):
 
 # Reuse the MockRequest class from test_main.py
 class MockRequest:
-    def __init__(self, files=None, json_data=None):
+    def __init__(self, files=None, json_data=None, headers=None):
         self.files = files or {}
         self._json = json_data or {}
+        self.headers = headers or {}
     
     def json(self):
         return self._json
@@ -162,8 +164,8 @@ async def test_graphql_documents_query():
 async def test_graphql_query_without_index():
     """Test querying documents when no index exists."""
     # Set index to None
-    original_index = schema.index
-    schema.index = None
+    original_index = store.index
+    store.index = None
     
     try:
         request = MockRequest(json_data={
@@ -181,7 +183,7 @@ async def test_graphql_query_without_index():
 
     finally:
         # Restore the original index
-        schema.index = original_index
+        store.index = original_index
 
 @pytest.mark.asyncio
 async def test_graphql_query_with_index():
@@ -190,11 +192,11 @@ async def test_graphql_query_with_index():
     mock_index = mock.MagicMock()
     mock_query_engine = mock.MagicMock()
     mock_index.as_query_engine.return_value = mock_query_engine
-    mock_query_engine.query.return_value = "This is a test GraphQL response"
+    mock_query_engine.aquery = mock.AsyncMock(return_value="This is a test GraphQL response")
     
     # Save original index and set mock
-    original_index = schema.index
-    schema.index = mock_index
+    original_index = store.index
+    store.index = mock_index
     
     try:
         request = MockRequest(json_data={
@@ -213,10 +215,10 @@ async def test_graphql_query_with_index():
         
         # Verify the correct methods were called
         mock_index.as_query_engine.assert_called_once()
-        mock_query_engine.query.assert_called_once_with("What is in the document?")
+        mock_query_engine.aquery.assert_called_once_with("What is in the document?")
     finally:
         # Restore the original index
-        schema.index = original_index
+        store.index = original_index
 
 @pytest.mark.asyncio
 async def test_graphql_invalid_query():
@@ -259,3 +261,20 @@ async def test_graphql_malformed_request():
         response = await graphql_endpoint(request)
 
         assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_graphql_mutations_use_ingest_pool():
+    """Document mutations queue in the ingest pool like REST uploads."""
+    from admission import AdmissionPool
+
+    pool = AdmissionPool("ingest", capacity=1, max_queue=0)
+    context = {"request": MockRequest(), "ingest_pool": pool}
+    async with pool.slot():
+        result = await schema.schema.execute(
+            'mutation { replaceDocument(name: "a.txt", content: "A") { success } }',
+            context_value=context,
+        )
+
+    assert result.errors[0].message == "ingest queue is full, retry later"
+    assert pool.stats()["rejected"] == 1
@@ -2,12 +2,15 @@ import pytest
 import unittest.mock as mock
 from pathlib import Path
 import json
-from main import health_check, upload_document, query_documents, VectorStoreIndex, SimpleDirectoryReader
+from llama_index.core import Document
+from main import health_check, upload_document, query_documents, retrieve_nodes, delete_document, store, VectorStoreIndex, SimpleDirectoryReader
 
 class MockRequest:
-    def __init__(self, files=None, json_data=None):
+    def __init__(self, files=None, json_data=None, path_params=None, headers=None):
         self.files = files or {}
         self._json = json_data or {}
+        self.path_params = path_params or {}
+        self.headers = headers or {}
     
     def json(self):
         return self._json
@@ -30,12 +33,14 @@ async def test_health_check():
     # If we got here without an error, the test passes
 
 @pytest.mark.asyncio
-@mock.patch('main.SimpleDirectoryReader')
-@mock.patch('main.VectorStoreIndex')
+@mock.patch.object(store, 'index', None)
+@mock.patch('document_store.SimpleDirectoryReader')
+@mock.patch('document_store.VectorStoreIndex')
 async def test_upload_document(mock_index, mock_reader, sample_document):
     # Setup mocks
-    mock_reader.return_value.load_data.return_value = ["mocked document"]
-    mock_index.from_documents.return_value = mock.MagicMock()
+    mock_reader.return_value.load_data.return_value = [
+        Document(text="mocked document", metadata={"file_name": sample_document.name})
+    ]
     
     # Create mock request with file
     with open(sample_document, "rb") as f:
@@ -44,26 +49,27 @@ async def test_upload_document(mock_index, mock_reader, sample_document):
     mock_request = MockRequest(files={sample_document.name: file_content})
     
     # Call the function
-    await upload_document(mock_request)
+    response = await upload_document(mock_request)
+    assert response["status_code"] == 200
     
     # Assertions - not checking response but verifying the function was called correctly
     mock_reader.assert_called_once_with("data")
-    mock_index.from_documents.assert_called_once()
+    mock_index.assert_called_once()
 
 @pytest.mark.asyncio
-@mock.patch('main.index', None)  # Simulate no documents uploaded
+@mock.patch.object(store, 'index', None)  # Simulate no documents uploaded
 async def test_query_without_documents():
     mock_request = MockRequest(json_data={"question": "What is in the document?"})
     await query_documents(mock_request)
     # Just verifying the function executes
 
 @pytest.mark.asyncio
-@mock.patch('main.index')
+@mock.patch.object(store, 'index')
 async def test_query_with_documents(mock_index):
     # Setup mock
     mock_query_engine = mock.MagicMock()
     mock_index.as_query_engine.return_value = mock_query_engine
-    mock_query_engine.query.return_value = "This is a test response"
+    mock_query_engine.aquery = mock.AsyncMock(return_value="This is a test response")
     
     # Create request with question
     mock_request = MockRequest(json_data={"question": "What is in the document?"})
@@ -73,11 +79,43 @@ async def test_query_with_documents(mock_index):
     
     # Assertions - not checking response but verifying the function called dependencies correctly
     mock_index.as_query_engine.assert_called_once()
-    mock_query_engine.query.assert_called_once_with("What is in the document?")
+    mock_query_engine.aquery.assert_called_once_with("What is in the document?")
 
 @pytest.mark.asyncio
-@mock.patch('main.index', mock.MagicMock())
+@mock.patch.object(store, 'index', mock.MagicMock())
 async def test_invalid_query():
     mock_request = MockRequest(json_data={})
     await query_documents(mock_request)
-    # Just verifying the function executes 
\ No newline at end of file
+    # Just verifying the function executes 
+@pytest.mark.asyncio
+@mock.patch.object(store, 'index')
+async def test_retrieve_nodes(mock_index):
+    # Shards answer coordinators with scored nodes rather than a synthesized answer
+    mock_index.as_retriever.return_value.retrieve.return_value = []
+    mock_request = MockRequest(json_data={"question": "What is in the document?", "top_k": 3})
+
+    response = await retrieve_nodes(mock_request)
+
+    mock_index.as_retriever.assert_called_once_with(similarity_top_k=3)
+    assert response["body"] == {"nodes": []}
+
+@pytest.mark.asyncio
+async def test_delete_document(sample_document):
+    mock_request = MockRequest(path_params={"name": sample_document.name})
+
+    response = await delete_document(mock_request)
+
+    assert response["status_code"] == 200
+    assert not sample_document.exists()
+
+@pytest.mark.asyncio
+async def test_delete_missing_document():
+    mock_request = MockRequest(path_params={"name": "missing.txt"})
+    response = await delete_document(mock_request)
+    assert response["status_code"] == 404
+
+@pytest.mark.asyncio
+async def test_delete_rejects_path_traversal():
+    mock_request = MockRequest(path_params={"name": "../main.py"})
+    response = await delete_document(mock_request)
+    assert response["status_code"] == 400
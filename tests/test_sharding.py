@@ -0,0 +1,229 @@
+import json
+import pytest
+import unittest.mock as mock
+from llama_index.core.schema import NodeWithScore, TextNode
+
+import sharding
+from sharding import ShardConfig, ShardCoordinator, shard_for, merge_top_k, nodes_to_json, nodes_from_json
+
+
+def make_node(node_id, score):
+    return NodeWithScore(node=TextNode(id_=node_id, text=f"text {node_id}"), score=score)
+
+
+def test_shard_for_is_stable_and_in_range():
+    """Documents always map to the same shard"""
+    for name in ["a.txt", "b.pdf", "report.md"]:
+        shard = shard_for(name, 4)
+        assert 0 <= shard < 4
+        assert shard_for(name, 4) == shard
+
+
+def test_config_from_env_defaults(monkeypatch):
+    """Without sharding variables the server is standalone"""
+    for var in ["SHARD_ID", "SHARD_COUNT", "SHARD_URLS", "DATA_DIR"]:
+        monkeypatch.delenv(var, raising=False)
+    config = ShardConfig.from_env()
+    assert not config.is_shard
+    assert not config.is_coordinator
+    assert config.data_dir == "data"
+
+
+def test_config_from_env_shard(monkeypatch):
+    """A shard keeps its documents in its own directory"""
+    monkeypatch.delenv("DATA_DIR", raising=False)
+    monkeypatch.delenv("SHARD_URLS", raising=False)
+    monkeypatch.setenv("SHARD_ID", "1")
+    monkeypatch.setenv("SHARD_COUNT", "2")
+    config = ShardConfig.from_env()
+    assert config.is_shard
+    assert config.data_dir == "data/shard-1"
+
+
+def test_config_rejects_invalid_shard_id(monkeypatch):
+    monkeypatch.delenv("SHARD_URLS", raising=False)
+    monkeypatch.setenv("SHARD_ID", "2")
+    monkeypatch.setenv("SHARD_COUNT", "2")
+    with pytest.raises(ValueError):
+        ShardConfig.from_env()
+
+
+def test_merge_top_k_orders_by_score():
+    merged = merge_top_k(
+        [[make_node("a", 0.9), make_node("b", 0.1)], [make_node("c", 0.5)]], 2
+    )
+    assert [node.node.node_id for node in merged] == ["a", "c"]
+
+
+def test_merge_top_k_drops_duplicate_chunks():
+    duplicate = NodeWithScore(node=TextNode(id_="b", text="text\n a"), score=0.8)
+    merged = merge_top_k([[make_node("a", 0.9)], [duplicate, make_node("c", 0.5)]], 2)
+    assert [node.node.node_id for node in merged] == ["a", "c"]
+
+
+def test_merge_top_k_keeps_chunks_differing_in_punctuation():
+    negative = NodeWithScore(node=TextNode(id_="a", text="Net change: -5%"), score=0.9)
+    positive = NodeWithScore(node=TextNode(id_="b", text="Net change: 5%"), score=0.8)
+    merged = merge_top_k([[negative], [positive]], 2)
+    assert [node.node.node_id for node in merged] == ["a", "b"]
+
+
+def test_nodes_json_round_trip():
+    nodes = nodes_from_json(nodes_to_json([make_node("a", 0.7)]))
+    assert nodes[0].node.node_id == "a"
+    assert nodes[0].node.get_content() == "text a"
+    assert nodes[0].score == 0.7
+
+
+@pytest.mark.asyncio
+async def test_coordinator_tolerates_failed_shard():
+    """A failing shard is skipped and the remaining results are merged"""
+    coordinator = ShardCoordinator(["http://shard-0", "http://shard-1"])
+
+    async def fake_retrieve(client, url, question, top_k):
+        if url == "http://shard-1":
+            raise RuntimeError("down")
+        return [make_node("a", 0.4)]
+
+    with mock.patch.object(coordinator, "_retrieve_from", side_effect=fake_retrieve):
+        nodes = await coordinator.retrieve("question", 2)
+    assert [node.node.node_id for node in nodes] == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_coordinator_retrieve_unwraps_shard_responses():
+    """Shards answer /retrieve with their handler dict inside a 200 JSON body"""
+    import httpx
+
+    def handler(request):
+        if request.url.host == "shard-1":
+            return httpx.Response(200, json={"status_code": 500, "body": "boom", "type": "text"})
+        nodes = nodes_to_json([make_node("a", 0.9)])
+        return httpx.Response(200, json={"status_code": 200, "body": {"nodes": nodes}, "type": "json"})
+
+    real_client = httpx.AsyncClient
+    coordinator = ShardCoordinator(["http://shard-0", "http://shard-1"])
+    with mock.patch("httpx.AsyncClient", side_effect=lambda **kwargs: real_client(
+            transport=httpx.MockTransport(handler), **kwargs)):
+        nodes = await coordinator.retrieve("question", 2)
+
+    assert [node.node.node_id for node in nodes] == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_coordinator_query_synthesizes_once():
+    coordinator = ShardCoordinator(["http://shard-0", "http://shard-1"])
+    nodes = [make_node("a", 0.4)]
+    synthesizer = mock.MagicMock()
+    synthesizer.asynthesize = mock.AsyncMock(return_value="merged answer")
+
+    with mock.patch.object(coordinator, "retrieve", mock.AsyncMock(return_value=nodes)):
+        with mock.patch("sharding.get_response_synthesizer", return_value=synthesizer):
+            response = await coordinator.query("question")
+
+    assert response == "merged answer"
+    synthesizer.asynthesize.assert_called_once_with("question", nodes=nodes)
+
+
+def test_configure_installs_coordinator():
+    original = sharding.config
+    try:
+        sharding.configure(ShardConfig(shard_urls=["http://shard-0"]))
+        assert isinstance(sharding.coordinator, ShardCoordinator)
+    finally:
+        sharding.configure(original)
+    assert sharding.coordinator is None
+
+
+def test_relay_response_keeps_text_errors():
+    """Plain text shard errors are relayed with their status code"""
+    import httpx
+    relayed = sharding.relay_response(
+        httpx.Response(503, text="ingest queue is full", headers={"Retry-After": "4"})
+    )
+    assert relayed.status_code == 503
+    assert relayed.description == "ingest queue is full"
+    assert relayed.headers.get("Retry-After") == "4"
+
+    relayed = sharding.relay_response(httpx.Response(200, json={"message": "ok"}))
+    assert relayed.status_code == 200
+    assert json.loads(relayed.description) == {"message": "ok"}
+
+
+def test_relay_response_unwraps_handler_envelope():
+    """A shard's handler dict arrives as a 200 JSON body carrying the real status"""
+    import httpx
+    envelope = {"status_code": 404, "body": "Document a.txt not found", "type": "text"}
+    assert sharding.unwrap_response(httpx.Response(200, json=envelope)) == envelope
+
+    relayed = sharding.relay_response(httpx.Response(200, json=envelope))
+    assert relayed.status_code == 404
+    assert relayed.description == "Document a.txt not found"
+
+    envelope = {"status_code": 200, "body": {"message": "deleted"}, "type": "json"}
+    relayed = sharding.relay_response(httpx.Response(200, json=envelope))
+    assert relayed.status_code == 200
+    assert json.loads(relayed.description) == {"message": "deleted"}
+
+
+@pytest.mark.asyncio
+async def test_graphql_delete_reports_shard_not_found():
+    import httpx
+    import schema
+    envelope = {"status_code": 404, "body": "Document a.txt not found", "type": "text"}
+    coordinator = mock.MagicMock()
+    coordinator.delete = mock.AsyncMock(return_value=httpx.Response(200, json=envelope))
+
+    with mock.patch.object(sharding, "coordinator", coordinator):
+        result = await schema.schema.execute(
+            'mutation { deleteDocument(name: "a.txt") { success message } }'
+        )
+
+    assert result.data == {
+        "deleteDocument": {"success": False, "message": "Document a.txt not found"}
+    }
+
+
+@pytest.mark.asyncio
+async def test_coordinator_delete_quotes_name():
+    """Names with URL delimiters are sent as a single path segment"""
+    import httpx
+    seen = []
+
+    def handler(request):
+        seen.append(request.url.raw_path)
+        return httpx.Response(404, text="not found")
+
+    real_client = httpx.AsyncClient
+    coordinator = ShardCoordinator(["http://shard-0"])
+    with mock.patch("httpx.AsyncClient", side_effect=lambda **kwargs: real_client(
+            transport=httpx.MockTransport(handler), **kwargs)):
+        response = await coordinator.delete("q1 #2?.txt")
+
+    assert seen == [b"/documents/q1%20%232%3F.txt"]
+    assert sharding.relay_response(response).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_coordinator_reuses_one_client():
+    """Queries, uploads and deletes share a pooled keep-alive client"""
+    import httpx
+
+    def handler(request):
+        if request.url.path == "/retrieve":
+            return httpx.Response(200, json={"status_code": 200, "body": {"nodes": []}, "type": "json"})
+        return httpx.Response(200, json={"message": "ok"})
+
+    real_client = httpx.AsyncClient
+    coordinator = ShardCoordinator(["http://shard-0", "http://shard-1"])
+    with mock.patch("httpx.AsyncClient", side_effect=lambda **kwargs: real_client(
+            transport=httpx.MockTransport(handler), **kwargs)) as client_factory:
+        await coordinator.retrieve("question", 2)
+        await coordinator.retrieve("question", 2)
+        await coordinator.upload("a.txt", b"A")
+        await coordinator.delete("a.txt")
+        client = coordinator.client
+
+        assert client_factory.call_count == 1
+        await coordinator.aclose()
+        assert client.is_closed
@@ -0,0 +1,214 @@
+import asyncio
+import os
+import pytest
+
+from watcher import DirectoryWatcher
+
+
+def contents(store):
+    return sorted(node.node.get_content() for node in store.retrieve("anything", top_k=10))
+
+
+@pytest.mark.asyncio
+async def test_initial_sync_builds_index(store, tmp_path):
+    (tmp_path / "a.txt").write_text("Alpha")
+    (tmp_path / "b.txt").write_text("Beta")
+    watcher = DirectoryWatcher(store)
+
+    changes = await watcher.sync(watcher.scan())
+
+    assert sorted(changes.added) == ["a.txt", "b.txt"]
+    assert contents(store) == ["Alpha", "Beta"]
+
+
+@pytest.mark.asyncio
+async def test_sync_applies_only_changes(store, tmp_path):
+    (tmp_path / "a.txt").write_text("Alpha")
+    (tmp_path / "b.txt").write_text("Beta")
+    watcher = DirectoryWatcher(store)
+    await watcher.sync(watcher.scan())
+    untouched_ids = list(store.documents["b.txt"])
+
+    (tmp_path / "a.txt").write_text("Alpha v2")
+    (tmp_path / "c.txt").write_text("Gamma")
+    changes = await watcher.sync(watcher.scan())
+
+    assert changes.added == ["c.txt"]
+    assert changes.changed == ["a.txt"]
+    assert store.documents["b.txt"] == untouched_ids
+    assert contents(store) == ["Alpha v2", "Beta", "Gamma"]
+
+
+@pytest.mark.asyncio
+async def test_touch_without_content_change_is_ignored(store, tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_text("Alpha")
+    watcher = DirectoryWatcher(store)
+    await watcher.sync(watcher.scan())
+    version = store.version
+
+    os.utime(path, (0, 0))
+    changes = await watcher.sync(watcher.scan())
+
+    assert not changes
+    assert store.version == version
+
+
+@pytest.mark.asyncio
+async def test_removed_file_is_dropped_from_index(store, tmp_path):
+    (tmp_path / "a.txt").write_text("Alpha")
+    (tmp_path / "b.txt").write_text("Beta")
+    watcher = DirectoryWatcher(store)
+    await watcher.sync(watcher.scan())
+
+    (tmp_path / "b.txt").unlink()
+    changes = await watcher.sync(watcher.scan())
+
+    assert changes.removed == ["b.txt"]
+    assert contents(store) == ["Alpha"]
+
+
+@pytest.mark.asyncio
+async def test_uploaded_files_are_not_reindexed(store, tmp_path):
+    (tmp_path / "a.txt").write_text("Alpha")
+    watcher = DirectoryWatcher(store)
+    await watcher.sync(watcher.scan())
+
+    store.add("b.txt", b"Uploaded")
+    changes = await watcher.sync(watcher.scan())
+
+    assert not changes
+
+
+@pytest.mark.asyncio
+async def test_run_debounces_bursts(store, tmp_path):
+    watcher = DirectoryWatcher(store, interval=0.01, debounce=0.1)
+    synced = []
+    original_sync = watcher.sync
+
+    async def counting_sync(snapshot):
+        synced.append(sorted(snapshot))
+        return await original_sync(snapshot)
+
+    watcher.sync = counting_sync
+    task = asyncio.ensure_future(watcher.run())
+    try:
+        await asyncio.sleep(0.03)
+        for i in range(3):
+            (tmp_path / f"{i}.txt").write_text(f"Document {i}")
+            await asyncio.sleep(0.03)
+        await asyncio.sleep(0.3)
+    finally:
+        task.cancel()
+
+    # One sync at startup and one for the whole burst
+    assert synced == [[], ["0.txt", "1.txt", "2.txt"]]
+    assert contents(store) == ["Document 0", "Document 1", "Document 2"]
+
+
+@pytest.mark.asyncio
+async def test_failed_reindex_is_retried(store, tmp_path, monkeypatch):
+    (tmp_path / "a.txt").write_text("Alpha")
+    # No backoff, so the next sync retries straight away
+    watcher = DirectoryWatcher(store, interval=0)
+    await watcher.sync(watcher.scan())
+
+    (tmp_path / "a.txt").write_text("Alpha, edited")
+    (tmp_path / "b.txt").write_text("Beta")
+    original = store.aindex_file
+
+    async def flaky_aindex_file(name):
+        if name == "a.txt":
+            raise RuntimeError("embedding service unavailable")
+        return await original(name)
+
+    monkeypatch.setattr(store, "aindex_file", flaky_aindex_file)
+    changes = await watcher.sync(watcher.scan())
+    assert changes.failed == ["a.txt"]
+    assert contents(store) == ["Alpha", "Beta"]
+
+    monkeypatch.setattr(store, "aindex_file", original)
+    changes = await watcher.sync(watcher.scan())
+    assert changes.changed == ["a.txt"]
+    assert not changes.failed
+    assert contents(store) == ["Alpha, edited", "Beta"]
+
+
+@pytest.mark.asyncio
+async def test_run_retries_failed_sync(store, tmp_path):
+    watcher = DirectoryWatcher(store, interval=0.01, debounce=0.02)
+    attempts = []
+    original_aindex_file = store.aindex_file
+
+    async def flaky_aindex_file(name):
+        attempts.append(name)
+        if len(attempts) == 1:
+            raise RuntimeError("embedding service unavailable")
+        return await original_aindex_file(name)
+
+    (tmp_path / "a.txt").write_text("Alpha")
+    await watcher.sync(watcher.scan())
+    store.aindex_file = flaky_aindex_file
+    task = asyncio.ensure_future(watcher.run())
+    try:
+        await asyncio.sleep(0.03)
+        (tmp_path / "b.txt").write_text("Beta")
+        await asyncio.sleep(0.3)
+    finally:
+        task.cancel()
+
+    assert attempts == ["b.txt", "b.txt"]
+    assert contents(store) == ["Alpha", "Beta"]
+
+
+@pytest.mark.asyncio
+async def test_failing_file_backs_off_until_it_changes(store, tmp_path, monkeypatch):
+    (tmp_path / "a.txt").write_text("Alpha")
+    watcher = DirectoryWatcher(store, interval=60)
+    await watcher.sync(watcher.scan())
+    attempts = []
+    original = store.aindex_file
+
+    async def failing_aindex_file(name):
+        attempts.append(name)
+        if "corrupt" in (tmp_path / name).read_text():
+            raise RuntimeError("cannot parse")
+        return await original(name)
+
+    monkeypatch.setattr(store, "aindex_file", failing_aindex_file)
+    (tmp_path / "b.txt").write_text("corrupt")
+    assert (await watcher.sync(watcher.scan())).failed == ["b.txt"]
+    # Not retried before its backoff expires
+    assert (await watcher.sync(watcher.scan())).failed == ["b.txt"]
+    assert attempts == ["b.txt"]
+
+    # A new version of the file is tried right away
+    (tmp_path / "b.txt").write_text("Beta")
+    changes = await watcher.sync(watcher.scan())
+    assert not changes.failed
+    assert attempts == ["b.txt", "b.txt"]
+    assert contents(store) == ["Alpha", "Beta"]
+
+
+@pytest.mark.asyncio
+async def test_run_backs_off_a_file_that_keeps_failing(store, tmp_path):
+    watcher = DirectoryWatcher(store, interval=0.01, debounce=0.02)
+    attempts = []
+
+    async def failing_aindex_file(name):
+        attempts.append(name)
+        raise RuntimeError("cannot parse")
+
+    (tmp_path / "a.txt").write_text("Alpha")
+    await watcher.sync(watcher.scan())
+    store.aindex_file = failing_aindex_file
+    task = asyncio.ensure_future(watcher.run())
+    try:
+        await asyncio.sleep(0.03)
+        (tmp_path / "b.txt").write_text("corrupt")
+        await asyncio.sleep(0.5)
+    finally:
+        task.cancel()
+
+    # Delays of 0.02, 0.04, 0.08, 0.16, 0.32s instead of a retry every tick
+    assert 2 <= len(attempts) <= 6
@@ -0,0 +1,181 @@
+import asyncio
+import os
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from document_store import DocumentStore, file_hash
+
+# File name -> (modification time, size)
+Snapshot = Dict[str, Tuple[float, int]]
+
+# Upper bound for the backoff between retries of a file that fails to index
+MAX_RETRY_DELAY = 300.0
+
+
+@dataclass
+class Changes:
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    # Added or changed files that could not be indexed and must be retried
+    failed: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+
+@dataclass
+class Failure:
+    """A file that could not be indexed, and when to try it again"""
+
+    attempts: int
+    retry_at: float
+    # Stats of the file that failed; a new version is retried right away
+    stats: Tuple[float, int]
+
+
+class DirectoryWatcher:
+    """Keep the index consistent with files written directly to the data directory.
+
+    The directory is polled for modification times and sizes. Once a burst of
+    changes has been quiet for ``debounce`` seconds, files whose content hash
+    differs from what was indexed are reindexed and files that disappeared are
+    deleted from the index, without rebuilding it. Files that fail to index
+    are retried with exponential backoff until they succeed or change.
+    """
+
+    def __init__(self, store: DocumentStore, interval: float = 1.0, debounce: float = 2.0):
+        self.store = store
+        self.interval = interval
+        self.debounce = debounce
+        # Stats of files at the last sync, so unchanged files are not rehashed
+        self._synced: Snapshot = {}
+        self._failures: Dict[str, Failure] = {}
+        self._sync_failures = 0
+
+    def scan(self) -> Snapshot:
+        """Modification time and size of every document in the data directory"""
+        snapshot = {}
+        try:
+            entries = list(os.scandir(self.store.data_dir))
+        except FileNotFoundError:
+            return snapshot
+        for entry in entries:
+            # Hidden files are skipped by SimpleDirectoryReader as well
+            if entry.is_file() and not entry.name.startswith("."):
+                stat = entry.stat()
+                snapshot[entry.name] = (stat.st_mtime, stat.st_size)
+        return snapshot
+
+    def diff(self, snapshot: Snapshot) -> Changes:
+        """Compare a snapshot with the indexed files, hashing only files whose stats changed"""
+        changes = Changes()
+        # Runs in a thread, so read the indexed hashes under the store's lock
+        with self.store._lock:
+            hashes = dict(self.store.hashes)
+        for name, stats in snapshot.items():
+            indexed_hash = hashes.get(name)
+            if indexed_hash is None:
+                changes.added.append(name)
+            elif self._synced.get(name) != stats:
+                try:
+                    if file_hash(os.path.join(self.store.data_dir, name)) != indexed_hash:
+                        changes.changed.append(name)
+                except FileNotFoundError:
+                    # Removed while scanning; the next scan picks it up
+                    continue
+        changes.removed = [name for name in hashes if name not in snapshot]
+        return changes
+
+    async def sync(self, snapshot: Snapshot) -> Changes:
+        """Apply the differences between a snapshot and the index"""
+        changes = await asyncio.to_thread(self.diff, snapshot)
+        if self.store.index is None:
+            # Nothing is indexed yet, so build from the whole directory once
+            if changes.added:
+                await asyncio.to_thread(self.store.load_directory)
+            self._synced = snapshot
+            return changes
+
+        indexed = set()
+        for name in changes.added + changes.changed:
+            failure = self._failures.get(name)
+            if failure is not None and failure.stats != snapshot[name]:
+                failure = None
+            if failure is not None and time.monotonic() < failure.retry_at:
+                # Still backing off from a failure of this version of the file
+                changes.failed.append(name)
+                continue
+            try:
+                await self.store.aindex_file(name)
+            except FileNotFoundError:
+                self._failures.pop(name, None)
+                continue
+            except Exception as e:
+                self._record_failure(name, failure, snapshot[name], e)
+                changes.failed.append(name)
+            else:
+                self._failures.pop(name, None)
+                indexed.add(name)
+        for name in changes.removed:
+            self.store.forget(name)
+        for name in [name for name in self._failures if name not in snapshot]:
+            del self._failures[name]
+        self.store.schedule_compaction()
+        # Failed files are left out so the next sync hashes and indexes them again
+        self._synced = {
+            name: stats for name, stats in snapshot.items() if name not in changes.failed
+        }
+        if indexed or changes.removed:
+            added = sum(1 for name in changes.added if name in indexed)
+            changed = sum(1 for name in changes.changed if name in indexed)
+            print(
+                f"Reindexed {self.store.data_dir}: {added} added, "
+                f"{changed} changed, {len(changes.removed)} removed"
+            )
+        return changes
+
+    def _retry_delay(self, attempts: int) -> float:
+        return min(self.interval * 2 ** min(attempts, 16), MAX_RETRY_DELAY)
+
+    def _record_failure(self, name: str, failure: Optional[Failure],
+                        stats: Tuple[float, int], error: Exception) -> None:
+        attempts = failure.attempts + 1 if failure is not None else 1
+        delay = self._retry_delay(attempts)
+        self._failures[name] = Failure(attempts, time.monotonic() + delay, stats)
+        # Only the first failure gets a full traceback
+        if attempts == 1:
+            traceback.print_exc()
+            print(f"Failed to index {name}, retrying in {delay:.0f}s")
+        else:
+            print(f"Failed to index {name} ({attempts} attempts): {error!r}, retrying in {delay:.0f}s")
+
+    async def run(self) -> None:
+        """Poll the data directory until cancelled"""
+        snapshot = self.scan()
+        # Bring the index in line with whatever is on disk at startup
+        sync_at = await self._try_sync(snapshot)
+
+        while True:
+            await asyncio.sleep(self.interval)
+            current = self.scan()
+            if current != snapshot:
+                snapshot = current
+                sync_at = time.monotonic() + self.debounce
+            elif sync_at is not None and time.monotonic() >= sync_at:
+                sync_at = await self._try_sync(current)
+
+    async def _try_sync(self, snapshot: Snapshot) -> Optional[float]:
+        """Sync, returning when to sync again if anything has to be retried"""
+        try:
+            changes = await self.sync(snapshot)
+        except Exception:
+            traceback.print_exc()
+            self._sync_failures += 1
+            return time.monotonic() + self._retry_delay(self._sync_failures)
+        self._sync_failures = 0
+        if not changes.failed:
+            return None
+        return min(self._failures[name].retry_at for name in changes.failed)